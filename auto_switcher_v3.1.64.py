@@ -15,37 +15,176 @@ Features:
 Press Ctrl+Alt+Q to quit
 """
 
-import threading
+import sys
 import time
+import _thread
+
+# --profile-startup: clocks at the first line of the script, and how long
+# every module imported after it took (see StartupProfile)
+STARTUP_PERF = time.perf_counter()
+STARTUP_WALL = time.time()
+STARTUP_IMPORTS = []  # (module, seconds including the modules it imports, nesting depth)
+
+
+def profile_imports():
+    """Time each first import made on the main thread into STARTUP_IMPORTS"""
+    import builtins
+    original_import = builtins.__import__
+    main_thread = _thread.get_ident()
+    depth = [0]
+    
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or _thread.get_ident() != main_thread:
+            return original_import(name, globals, locals, fromlist, level)
+        depth[0] += 1
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            depth[0] -= 1
+            STARTUP_IMPORTS.append((name, time.perf_counter() - start, depth[0]))
+    
+    builtins.__import__ = timed_import
+
+
+if '--profile-startup' in sys.argv:
+    profile_imports()
+
+import threading
+import queue
 import ctypes
-import sys
+import gc
 import os
 import configparser
+import mmap
+import struct
+import math
+import re
+import hashlib
+import csv
+import json
+import enum
+import importlib.util
+from collections import OrderedDict, Counter, deque
+from contextlib import contextmanager, redirect_stdout
+
+# Time spent importing each third-party module, in seconds. Only what the
+# hook needs is imported at startup; NumPy, PIL, OpenCV and enchant are
+# imported on first use.
+IMPORT_TIMES = {}
+IMPORT_BUDGET_MS = 250  # Startup imports above this are reported as over budget
+
 
+@contextmanager
+def import_timer(name):
+    """Record how long the imports inside the block take in IMPORT_TIMES"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        IMPORT_TIMES[name] = time.perf_counter() - start
+
+
+def startup_import_ms():
+    """Total time spent on imports so far, in milliseconds"""
+    return sum(IMPORT_TIMES.values()) * 1000
+
+
+# OS packages are only needed by WindowsBackend - without them the engine
+# still imports (FakeBackend, --classify-file, --replay), but main() won't
+# start the live switcher.
 try:
-    from pynput import keyboard as pynput_keyboard
-    from pynput.keyboard import Key, Controller as KeyboardController, KeyCode
-    from pynput import mouse as pynput_mouse
-    import win32api
-    import win32gui
-    import win32con
-    import keyboard
-    import pyautogui
-    import pyperclip
-except ImportError as e:
-    print("Missing packages. Run: pip install pynput pywin32 keyboard pyenchant pyautogui opencv-python pyperclip")
-    sys.exit(1)
-
-# Try to import enchant for English dictionary
+    with import_timer('pynput'):
+        from pynput import keyboard as pynput_keyboard
+        from pynput.keyboard import Key, KeyCode
+        from pynput import mouse as pynput_mouse
+    PYNPUT_AVAILABLE = True
+except ImportError:
+    PYNPUT_AVAILABLE = False
+    
+    class Key(enum.Enum):
+        """Stand-in for pynput.keyboard.Key (the keys the switcher looks at)"""
+        alt = 'alt'
+        alt_l = 'alt_l'
+        alt_r = 'alt_r'
+        backspace = 'backspace'
+        caps_lock = 'caps_lock'
+        ctrl = 'ctrl'
+        ctrl_l = 'ctrl_l'
+        ctrl_r = 'ctrl_r'
+        delete = 'delete'
+        down = 'down'
+        end = 'end'
+        enter = 'enter'
+        esc = 'esc'
+        home = 'home'
+        left = 'left'
+        right = 'right'
+        shift = 'shift'
+        shift_l = 'shift_l'
+        shift_r = 'shift_r'
+        space = 'space'
+        tab = 'tab'
+        up = 'up'
+    
+    class KeyCode:
+        """Stand-in for pynput.keyboard.KeyCode"""
+        
+        def __init__(self, vk=None, char=None):
+            self.vk = vk
+            self.char = char
+        
+        @classmethod
+        def from_vk(cls, vk):
+            return cls(vk=vk)
+        
+        @classmethod
+        def from_char(cls, char):
+            return cls(char=char)
+        
+        def __eq__(self, other):
+            return isinstance(other, KeyCode) and (self.vk, self.char) == (other.vk, other.char)
+        
+        def __hash__(self):
+            return hash((self.vk, self.char))
+
 try:
-    import enchant
-    ENCHANT_AVAILABLE = True
+    with import_timer('pywin32'):
+        import win32api
+        import win32gui
+    with import_timer('keyboard'):
+        import keyboard
+    WINDOWS_AVAILABLE = PYNPUT_AVAILABLE
 except ImportError:
-    ENCHANT_AVAILABLE = False
+    WINDOWS_AVAILABLE = False
+
+# enchant (English dictionary) is imported by the background loader
+enchant = None
+ENCHANT_AVAILABLE = importlib.util.find_spec('enchant') is not None
+
+# NumPy / PIL / OpenCV are only needed by the Outlook button search - imported
+# by load_imaging() the first time it runs
+np = None
+cv2 = None
+PIL_Image = None
 
-# Configure pyautogui
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.05
+
+def load_imaging():
+    """Import NumPy and PIL (and OpenCV if installed) on first use"""
+    global np, cv2, PIL_Image
+    if np is None:
+        with import_timer('numpy'):
+            import numpy
+        with import_timer('PIL'):
+            from PIL import Image
+        try:
+            with import_timer('cv2'):
+                import cv2 as opencv
+            cv2 = opencv
+        except ImportError:
+            cv2 = None
+        PIL_Image = Image
+        np = numpy
 
 
 def get_script_dir():
@@ -56,6 +195,22 @@ def get_script_dir():
         return os.path.dirname(os.path.abspath(__file__))
 
 
+def get_user_data_dir():
+    """Per-user folder for what the switcher learns from this user's typing
+    (%LOCALAPPDATA%\\auto_switcher). The script dir may be a shared install
+    folder that every session on a terminal server uses. Falls back to the
+    script dir if there is no LOCALAPPDATA or the folder can't be created."""
+    local_app_data = os.environ.get('LOCALAPPDATA')
+    if local_app_data:
+        folder = os.path.join(local_app_data, 'auto_switcher')
+        try:
+            os.makedirs(folder, exist_ok=True)
+            return folder
+        except OSError:
+            pass
+    return get_script_dir()
+
+
 def load_config():
     """Load config from config.ini"""
     config_path = os.path.join(get_script_dir(), 'config.ini')
@@ -68,74 +223,1080 @@ def load_config():
         config['Settings'] = {'block_delay_ms': '2000'}
         with open(config_path, 'w') as f:
             f.write("[Settings]\n")
-            f.write("# Time in milliseconds to keep keyboard blocked after fix\n")
+            f.write("# Longest time in milliseconds to keep keyboard blocked after a fix while the\n")
+            f.write("# app takes the corrected text and the new layout (0 = no block)\n")
             f.write("block_delay_ms=2000\n")
+            f.write("# Number of English spell-check results remembered between runs\n")
+            f.write("english_cache_size=20000\n")
+            f.write("# Number of recent word decisions remembered while running\n")
+            f.write("decision_cache_size=4096\n")
+            f.write("# Debug log (switcher_log.txt) size before it is rotated to switcher_log.txt.1\n")
+            f.write("log_max_kb=512\n")
+            f.write("# Debug log lines buffered in memory; lines beyond this are dropped and counted\n")
+            f.write("log_buffer_lines=10000\n")
+            f.write("# Outdated lines allowed in ignore_words.txt / learned_words.txt before they are rewritten\n")
+            f.write("word_list_compact_lines=200\n")
+            f.write("# Most-typed Hebrew words kept in the fast in-memory tier in front of the full dictionary\n")
+            f.write("hebrew_hot_words=4000\n")
     
     try:
         block_delay_ms = config.getint('Settings', 'block_delay_ms')
     except:
         block_delay_ms = 2000
     
-    return {'block_delay_ms': block_delay_ms}
+    try:
+        english_cache_size = config.getint('Settings', 'english_cache_size')
+    except:
+        english_cache_size = 20000
+    
+    try:
+        decision_cache_size = config.getint('Settings', 'decision_cache_size')
+    except:
+        decision_cache_size = 4096
+    
+    try:
+        log_max_kb = config.getint('Settings', 'log_max_kb')
+    except:
+        log_max_kb = 512
+    
+    try:
+        log_buffer_lines = config.getint('Settings', 'log_buffer_lines')
+    except:
+        log_buffer_lines = 10000
+    
+    try:
+        word_list_compact_lines = config.getint('Settings', 'word_list_compact_lines')
+    except:
+        word_list_compact_lines = 200
+    
+    try:
+        hebrew_hot_words = config.getint('Settings', 'hebrew_hot_words')
+    except:
+        hebrew_hot_words = 4000
+    
+    return {
+        'block_delay_ms': block_delay_ms,
+        'english_cache_size': english_cache_size,
+        'decision_cache_size': decision_cache_size,
+        'log_max_kb': log_max_kb,
+        'log_buffer_lines': log_buffer_lines,
+        'word_list_compact_lines': word_list_compact_lines,
+        'hebrew_hot_words': hebrew_hot_words,
+    }
 
 
-def load_ignored_words():
-    """Load ignored words from ignore_words.txt"""
-    words_path = os.path.join(get_script_dir(), 'ignore_words.txt')
-    ignored = set()
+class EnglishSpellCache:
+    """Bounded LRU cache of enchant check() results, persisted between runs.
+    
+    File format (english_cache.txt): first line '# <tag>', then one
+    'word<TAB>1' line per entry, least recently used first. The tag names
+    the enchant provider, dictionary language and version; a cache written
+    under a different tag is discarded on load.
+    
+    Only words the dictionary accepted are saved. Misses - typos, but also
+    passwords and anything else typed in the wrong layout - stay in memory.
+    """
+    
+    def __init__(self, max_size=20000, tag=''):
+        self.max_size = max_size
+        self.tag = tag
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, word):
+        """Cached result for word, or None on a miss"""
+        with self._lock:
+            result = self._entries.get(word)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(word)
+            self.hits += 1
+            return result
+    
+    def put(self, word, result):
+        with self._lock:
+            self._entries[word] = bool(result)
+            self._entries.move_to_end(word)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.dirty = True
     
-    if os.path.exists(words_path):
+    def stats(self):
+        total = self.hits + self.misses
+        hit_ratio = self.hits / total if total else 0.0
+        return f"{len(self._entries):,}/{self.max_size:,} entries, {self.hits:,} hits, {self.misses:,} misses ({hit_ratio:.0%} hit ratio)"
+    
+    @classmethod
+    def load(cls, path, tag, max_size):
+        cache = cls(max_size, tag)
+        if not os.path.exists(path):
+            return cache
         try:
-            with open(words_path, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.readline().rstrip('\n') != f"# {tag}":
+                    print("  English cache is from another dictionary version - discarded")
+                    return cache
                 for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        ignored.add(line)
-                        ignored.add(line.lower())
-            print(f"  Loaded {len(ignored)//2} ignored words")
+                    word, _, result = line.rstrip('\n').partition('\t')
+                    if word and result == '1':
+                        cache._entries[word] = True
+            while len(cache._entries) > max_size:
+                cache._entries.popitem(last=False)
+            print(f"  Loaded English cache: {len(cache):,} words")
+        except Exception as e:
+            print(f"  Error loading english_cache.txt: {e}")
+        return cache
+    
+    def save(self, path):
+        """Write the cache if it changed since the last save"""
+        if not self.dirty:
+            return
+        with self._lock:
+            lines = [f"{word}\t1\n" for word, result in self._entries.items() if result]
+            self.dirty = False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(f"# {self.tag}\n")
+                f.writelines(lines)
+            os.replace(tmp_path, path)
         except Exception as e:
-            print(f"  Error loading ignore_words.txt: {e}")
+            self.dirty = True
+            print(f"  Error saving english_cache.txt: {e}")
+
+
+class DecisionCache:
+    """Bounded LRU of analyze_and_fix() decisions keyed by (keys, tracked_language).
+    
+    Invalidation is generation based: every change bumps `generation`, and
+    each entry remembers the generation it was computed at. A dictionary
+    reload makes all older entries stale; an ignore/learned change only
+    stales entries for the affected key spelling. Stale entries are dropped
+    lazily when they are next looked up.
+    """
+    
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._valid_from = 0
+        self._keys_valid_from = {}  # canonical keys -> generation of last change
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, keys, tracked_language):
+        """Cached decision, or None on a miss / stale entry"""
+        with self._lock:
+            entry = self._entries.get((keys, tracked_language))
+            if entry is not None:
+                generation, decision = entry
+                if (generation >= self._valid_from and
+                        generation >= self._keys_valid_from.get(canonical_hebrew_keys(keys), 0)):
+                    self._entries.move_to_end((keys, tracked_language))
+                    self.hits += 1
+                    return decision
+                del self._entries[(keys, tracked_language)]
+            self.misses += 1
+            return None
     
-    return ignored
+    def put(self, keys, tracked_language, generation, decision):
+        """Store a decision computed starting at `generation` (read it before
+        deciding, so a change made meanwhile leaves the entry stale)"""
+        with self._lock:
+            self._entries[(keys, tracked_language)] = (generation, decision)
+            self._entries.move_to_end((keys, tracked_language))
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate_keys(self, keys):
+        """Expire decisions for one key spelling (ignore/learned change)"""
+        with self._lock:
+            self.generation += 1
+            self._keys_valid_from[canonical_hebrew_keys(keys)] = self.generation
+    
+    def invalidate_all(self):
+        """Expire every decision (dictionary reload)"""
+        with self._lock:
+            self.generation += 1
+            self._valid_from = self.generation
+            self._keys_valid_from.clear()
+    
+    def stats(self):
+        total = self.hits + self.misses
+        hit_ratio = self.hits / total if total else 0.0
+        return f"{len(self._entries):,}/{self.max_size:,} entries, {self.hits:,} hits, {self.misses:,} misses ({hit_ratio:.0%} hit ratio)"
 
 
-def load_learned_words():
-    """Load learned words from learned_words.txt
-    Format: keys,target_language (e.g., akuo,hebrew)
-    Returns dict: {keys: target_language}
+class HotWordTier:
+    """The Hebrew words this user types most, as a small set checked before
+    the full dictionary (the cold tier).
+    
+    Every word the cold tier confirms is counted, and so is every later use
+    of it that the decision cache answers (see repeat()); after PROMOTE_AFTER
+    uses it is promoted into the hot set. When the hot set passes
+    max_size it is cut back to the most-used 3/4 and all counts are halved,
+    so words that fell out of use age out. Entries are canonical key
+    spellings (canonical_hebrew_keys), the form the hook looks up.
+    
+    File format (hebrew_hot_words.txt): one 'keys<TAB>count' line per
+    counted word, most used first. Entries are checked against the cold tier
+    when loaded, so a dictionary change can't leave stale hot words.
     """
-    words_path = os.path.join(get_script_dir(), 'learned_words.txt')
-    learned = {}
     
-    if os.path.exists(words_path):
+    PROMOTE_AFTER = 2
+    
+    def __init__(self, max_size=4000):
+        self.max_size = max_size
+        self.hot_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._hot = set()
+        self._counts = Counter()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._hot)
+    
+    def __contains__(self, keys):
+        """Hot tier probe - counts a hot hit"""
+        if keys in self._hot:
+            self.hot_hits += 1
+            return True
+        return False
+    
+    def record(self, keys, found):
+        """Result of the cold tier probe for keys (after a hot miss)"""
+        if not found:
+            self.misses += 1
+            return
+        self.cold_hits += 1
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._count(keys)
+    
+    def repeat(self, keys):
+        """Another use of a word without a tier lookup (the decision cache
+        answered it). Counted only if the cold tier confirmed it before."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if keys in self._counts:
+                self._count(keys)
+    
+    def _count(self, keys):
+        self._counts[keys] += 1
+        self.dirty = True
+        if self._counts[keys] >= self.PROMOTE_AFTER:
+            self._hot.add(keys)
+            if len(self._hot) > self.max_size:
+                self._trim()
+    
+    def _trim(self):
+        keep = sorted(self._hot, key=self._counts.__getitem__, reverse=True)[:self.max_size * 3 // 4]
+        self._counts = Counter({k: c // 2 for k, c in self._counts.items() if c // 2})
+        self._hot = {k for k in keep if k in self._counts}
+    
+    def retain(self, is_word):
+        """Drop entries is_word(keys) rejects (after a dictionary reload)"""
+        with self._lock:
+            self._counts = Counter({k: c for k, c in self._counts.items() if is_word(k)})
+            self._hot = {k for k in self._hot if k in self._counts}
+            self.dirty = True
+    
+    def stats(self):
+        lookups = self.hot_hits + self.cold_hits + self.misses
+        hot_ratio = self.hot_hits / lookups if lookups else 0.0
+        cold_lookups = lookups - self.hot_hits
+        cold_ratio = self.cold_hits / cold_lookups if cold_lookups else 0.0
+        return (f"{len(self._hot):,}/{self.max_size:,} hot words, {lookups:,} lookups, "
+                f"hot tier {self.hot_hits:,} hits ({hot_ratio:.0%}), cold tier {self.cold_hits:,} hits ({cold_ratio:.0%}), "
+                f"{self.misses:,} not found")
+    
+    def summary(self):
+        """Counts for reports (--replay)"""
+        return {'hot_words': len(self._hot), 'hot_hits': self.hot_hits,
+                'cold_hits': self.cold_hits, 'misses': self.misses}
+    
+    @classmethod
+    def load(cls, path, max_size, is_word):
+        tier = cls(max_size)
+        if not os.path.exists(path):
+            return tier
         try:
-            with open(words_path, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and ',' in line:
-                        parts = line.split(',', 1)
-                        if len(parts) == 2:
-                            keys, target_lang = parts
-                            learned[keys.lower()] = target_lang
-            print(f"  Loaded {len(learned)} learned words")
+                    keys, _, count = line.rstrip('\n').partition('\t')
+                    if keys and count.isdigit() and is_word(keys):
+                        tier._counts[keys] = int(count)
+            ranked = [k for k, c in tier._counts.most_common(max_size) if c >= cls.PROMOTE_AFTER]
+            tier._hot = set(ranked)
+            print(f"  Loaded Hebrew hot words: {len(tier):,} words")
         except Exception as e:
-            print(f"  Error loading learned_words.txt: {e}")
+            print(f"  Error loading hebrew_hot_words.txt: {e}")
+        return tier
+    
+    def save(self, path):
+        """Write the counts if they changed since the last save"""
+        if not self.dirty:
+            return
+        with self._lock:
+            lines = [f"{keys}\t{count}\n" for keys, count in self._counts.most_common()]
+            self.dirty = False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.dirty = True
+            print(f"  Error saving hebrew_hot_words.txt: {e}")
+
+
+class AsyncFileLogger:
+    """Debug log written by a background thread.
+    
+    write() only timestamps the line and puts it on a bounded queue, so the
+    hook thread never touches the disk. The writer thread drains the queue in
+    batches, one write + flush per batch. When the file passes max_bytes it is
+    renamed to '<path>.1' (older backups shift up to `backups`) and a new file
+    is started - the log is never read back. If the queue is full the line is
+    dropped and counted; the count is written to the log once there is room.
+    """
+    
+    BATCH_LINES = 256
+    
+    def __init__(self, path, max_bytes=512 * 1024, backups=1, buffer_lines=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max(buffer_lines, 1))
+        self._file = None
+        self._size = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def write(self, msg):
+        try:
+            self._queue.put_nowait((time.time(), msg))
+        except queue.Full:
+            self.dropped += 1
+    
+    def close(self, timeout=2.0):
+        """Flush what is queued and stop the writer thread. Gives up if the
+        queue stays full for `timeout` (the writer is stuck)."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+    
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+    
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+    
+    def _format(self, stamp, msg):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stamp))
+        return f"[{timestamp}] {msg}\n"
+    
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_LINES:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+            
+            lines = [self._format(stamp, msg) for stamp, msg in batch]
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(self._format(time.time(), f"LOG: dropped {dropped} lines (buffer full)"))
+            try:
+                if self._file is None:
+                    self._open()
+                text = ''.join(lines)
+                self._file.write(text)
+                self._file.flush()
+                self._size += len(text.encode('utf-8'))
+                self.written += len(lines)
+                if self._size > self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                print(f"  Log write failed: {e}")
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+        
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram: values in microseconds, bucketed with
+    SIGNIFICANT_BITS of precision (about 3% relative error) at every
+    magnitude, so memory stays small however many values are recorded."""
+    
+    SIGNIFICANT_BITS = 5
+    
+    def __init__(self):
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self._buckets = Counter()
+        self._lock = threading.Lock()
+    
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        shift = max(0, value.bit_length() - self.SIGNIFICANT_BITS)
+        bucket = value >> shift << shift
+        with self._lock:
+            self._buckets[bucket] += 1
+            self.count += 1
+            self.total_us += value
+            self.max_us = max(self.max_us, value)
+    
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile, in microseconds"""
+        with self._lock:
+            buckets = sorted(self._buckets.items())
+            count = self.count
+        if not count:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * count))
+        seen = 0
+        for bucket, n in buckets:
+            seen += n
+            if seen >= rank:
+                shift = max(0, bucket.bit_length() - self.SIGNIFICANT_BITS)
+                return min(bucket + (1 << shift) - 1, self.max_us)
+        return self.max_us
     
-    return learned
+    def summary(self):
+        """Count, mean, p50/p90/p99/p99.9 and max in milliseconds"""
+        result = {'count': self.count, 'mean_ms': round(self.total_us / self.count / 1000, 3) if self.count else 0}
+        for pct in (50, 90, 99, 99.9):
+            result[f'p{pct:g}_ms'] = round(self.percentile(pct) / 1000, 3)
+        result['max_ms'] = round(self.max_us / 1000, 3)
+        return result
+
+
+class LatencyStats:
+    """Named LatencyHistograms for the stages of the fix pipeline and the hook.
+    
+    Stages: hook (key press callback), classify, switch_keyboard, inject
+    (the batched erase + retype), alignment, block_delay, the completion
+    waits (wait_input_idle, wait_layout, wait_hotkey_release), and the whole
+    fix / undo / force_fix.
+    """
+    
+    def __init__(self):
+        self.histograms = {}
+        self.timeouts = Counter()  # wait_for() name -> waits that hit their ceiling
+        self._lock = threading.Lock()
+    
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+    
+    def record(self, stage, seconds):
+        self.histogram(stage).record(seconds)
+    
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in list(self.histograms.items())}
+    
+    def report(self):
+        """Text table, one stage per line"""
+        columns = ('count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'p99.9_ms', 'max_ms')
+        lines = [f"{'stage':<16}" + ''.join(f"{c:>11}" for c in columns)]
+        for stage, summary in self.summary().items():
+            lines.append(f"{stage:<16}" + ''.join(f"{summary[c]:>11}" for c in columns))
+        if self.timeouts:
+            lines.append("timeouts: " + ', '.join(f"{name} {n}" for name, n in self.timeouts.items()))
+        return '\n'.join(lines)
+    
+    def save(self, path):
+        """Write the report to path (replacing it)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"# Latency per stage - {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(self.report() + '\n')
+        os.replace(tmp_path, path)
+
+
+class WordListFile:
+    """A word list (ignore_words.txt, learned_words.txt): a snapshot followed
+    by an append-only journal, in one text file.
+    
+    The file starts with '#' comment lines, then one entry per line. add()
+    appends one line and fsyncs it, and never rewrites what is already there.
+    A key listed more than once takes its last value (last writer wins). Once
+    more than `compact_lines` lines are outdated by later ones, the file is
+    compacted: the header and one line per key are written to '<path>.tmp',
+    fsynced and renamed over the file, so a crash leaves either the old or the
+    new file. Callers serialize access (WORD_LISTS_LOCK).
+    """
+    
+    def __init__(self, path, parse, format, compact_lines=200):
+        self.path = path
+        self.parse = parse      # line -> (key, value), or None to skip the line
+        self.format = format    # (key, value) -> line
+        self.compact_lines = compact_lines
+        self.entries = {}       # key -> value, oldest write first
+        self.header = []
+        self.outdated = 0       # Lines a later line overrides
+        self.compactions = 0
+    
+    def load(self):
+        """Read the file (compacting it if due). Returns a new entries dict."""
+        entries = {}
+        header = []
+        lines = 0
+        text = ''
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                if not entries:
+                    header.append(line)
+                continue
+            entry = self.parse(line)
+            if entry is None:
+                continue
+            key, value = entry
+            entries.pop(key, None)  # Re-insert so order follows the last write
+            entries[key] = value
+            lines += 1
+        
+        self.entries = entries
+        self.header = header
+        self.outdated = lines - len(entries)
+        if self.outdated > self.compact_lines:
+            self.compact()
+        return entries
+    
+    def add(self, key, value):
+        """Record key = value. Returns False if that is already the current value."""
+        if key in self.entries and self.entries[key] == value:
+            return False
+        line = self.format(key, value) + '\n'
+        with open(self.path, 'a+b') as f:
+            # A hand-edited file may not end with a newline
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = '\n' + line
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        if key in self.entries:
+            self.outdated += 1
+            del self.entries[key]
+        self.entries[key] = value
+        if self.outdated > self.compact_lines:
+            self.compact()
+        return True
+    
+    def compact(self):
+        """Rewrite the file as the header plus one line per key"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in self.header:
+                f.write(line + '\n')
+            for key, value in self.entries.items():
+                f.write(self.format(key, value) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        print(f"  Compacted {os.path.basename(self.path)} ({self.outdated} outdated lines removed)")
+        self.outdated = 0
+        self.compactions += 1
+
+
+def parse_ignored_word(line):
+    """ignore_words.txt line -> (word, None); matching is case-insensitive"""
+    return line.lower(), None
+
+
+def format_ignored_word(word, value):
+    return word
+
+
+def parse_learned_word(line):
+    """learned_words.txt line 'keys,target_language' (e.g. akuo,hebrew) -> (keys, target_language).
+    Anything else - like a line cut short by a crash mid-append - is skipped."""
+    keys, sep, target_lang = line.partition(',')
+    target_lang = target_lang.strip()
+    if not sep or not keys or target_lang not in ('hebrew', 'english'):
+        return None
+    return keys.lower(), target_lang
+
+
+def format_learned_word(keys, target_lang):
+    return f"{keys},{target_lang}"
+
+
+class CompiledWordList:
+    """Read-only sorted word list, queried in place through mmap.
+    
+    File layout (little-endian):
+      magic 'HEWD' | version u16 | bloom hashes u16 | count u32 | bloom bytes u32
+      bloom filter                - bit array, `bloom hashes` bits set per word
+      offsets u32 * (count + 1)   - start of each word in the blob
+      blob                        - UTF-8 words, sorted bytewise, no separators
+    Version 1 files have no bloom fields (the hashes field is reserved).
+    
+    Lookups are a binary search over the mapped file, so nothing is copied
+    into Python objects except the few entries visited by the search. The
+    bloom filter is checked first: most words that aren't in the list are
+    rejected by a few byte reads, without searching.
+    """
+    
+    MAGIC = b'HEWD'
+    VERSION = 2
+    HEADER = struct.Struct('<4sHHI')
+    BLOOM_HEADER = struct.Struct('<I')
+    BLOOM_BITS_PER_WORD = 10  # With 7 hashes: about 1% of non-words get through
+    BLOOM_HASHES = 7
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hashes, count = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC or version not in (1, self.VERSION):
+            self._mm.close()
+            raise ValueError(f"{os.path.basename(path)} is not a compiled word list (v{self.VERSION})")
+        self._count = count
+        self._bloom_start = self.HEADER.size
+        self._bloom_hashes = 0
+        self._bloom_bits = 0
+        if version >= 2:
+            bloom_bytes, = self.BLOOM_HEADER.unpack_from(self._mm, self._bloom_start)
+            self._bloom_start += self.BLOOM_HEADER.size
+            self._bloom_hashes = hashes
+            self._bloom_bits = bloom_bytes * 8
+        self._offsets_start = self._bloom_start + self._bloom_bits // 8
+        self._data_start = self._offsets_start + 4 * (count + 1)
+        self.probes = 0
+        self.bloom_rejects = 0
+    
+    def __len__(self):
+        return self._count
+    
+    def _offset(self, i):
+        return struct.unpack_from('<I', self._mm, self._offsets_start + 4 * i)[0]
+    
+    def _entry(self, i):
+        start = self._data_start + self._offset(i)
+        end = self._data_start + self._offset(i + 1)
+        return self._mm[start:end]
+    
+    def _lower_bound(self, key, lo=0, hi=None):
+        """Index of the first entry >= key (bytes)"""
+        if hi is None:
+            hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def prefix_range(self, prefix, lo=0, hi=None):
+        """Narrow [lo, hi) to the entries starting with prefix (bytes).
+        All entries in the given range must already share prefix[:-1]."""
+        if hi is None:
+            hi = self._count
+        lo = self._lower_bound(prefix, lo, hi)
+        n = len(prefix)
+        end = lo
+        while end < hi:
+            mid = (end + hi) // 2
+            if self._entry(mid)[:n] <= prefix:
+                end = mid + 1
+            else:
+                hi = mid
+        return lo, end
+    
+    def is_entry(self, i, key):
+        """True if entry i is exactly key (bytes)"""
+        return i < self._count and self._entry(i) == key
+    
+    @staticmethod
+    def _bloom_positions(key, bits, hashes):
+        """Bit positions for key (bytes) - double hashing over one blake2b digest"""
+        h1, h2 = struct.unpack('<II', hashlib.blake2b(key, digest_size=8).digest())
+        h2 |= 1
+        return [(h1 + i * h2) % bits for i in range(hashes)]
+    
+    def _maybe_contains(self, key):
+        """False if the bloom filter rules key out"""
+        mm = self._mm
+        start = self._bloom_start
+        for pos in self._bloom_positions(key, self._bloom_bits, self._bloom_hashes):
+            if not (mm[start + (pos >> 3)] >> (pos & 7)) & 1:
+                return False
+        return True
+    
+    def index_of(self, key):
+        """Index of the entry equal to key (bytes), or -1"""
+        self.probes += 1
+        if self._bloom_bits and not self._maybe_contains(key):
+            self.bloom_rejects += 1
+            return -1
+        i = self._lower_bound(key)
+        return i if i < self._count and self._entry(i) == key else -1
+    
+    def __contains__(self, word):
+        if not isinstance(word, str) or not word:
+            return False
+        return self.index_of(word.encode('utf-8')) >= 0
+    
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._entry(i).decode('utf-8')
+    
+    @property
+    def size_bytes(self):
+        return len(self._mm)
+    
+    def close(self):
+        self._mm.close()
+    
+    @classmethod
+    def encode(cls, words):
+        """The compiled form of words, as a list of byte strings"""
+        encoded = sorted({w.encode('utf-8') for w in words if w})
+        offsets = [0]
+        for word in encoded:
+            offsets.append(offsets[-1] + len(word))
+        
+        bloom = bytearray(max(1, (len(encoded) * cls.BLOOM_BITS_PER_WORD + 7) // 8))
+        for word in encoded:
+            for pos in cls._bloom_positions(word, len(bloom) * 8, cls.BLOOM_HASHES):
+                bloom[pos >> 3] |= 1 << (pos & 7)
+        
+        return [cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.BLOOM_HASHES, len(encoded)),
+                cls.BLOOM_HEADER.pack(len(bloom)),
+                bytes(bloom),
+                struct.pack(f'<{len(offsets)}I', *offsets),
+                b''.join(encoded)]
+    
+    @classmethod
+    def compile(cls, words, dst_path):
+        """Write words to dst_path in the compiled format. Returns word count."""
+        chunks = cls.encode(words)
+        write_compiled(dst_path, chunks)
+        return len(chunks[-2]) // 4 - 1
+
+
+def write_compiled(dst_path, chunks):
+    """Write byte strings to dst_path, replacing it in one step"""
+    # Per-process temp name - several instances may compile at once
+    tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.writelines(chunks)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_word_file(path):
+    """Read a one-word-per-line text file into a set"""
+    words = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word:
+                words.add(word)
+    return words
+
+
+def compile_hebrew_dictionary(src_path=None, dst_path=None):
+    """Convert hebrew_words.txt into the compiled hebrew_words.bin"""
+    src_path = src_path or os.path.join(get_script_dir(), 'hebrew_words.txt')
+    dst_path = dst_path or os.path.join(get_script_dir(), 'hebrew_words.bin')
+    count = CompiledWordList.compile(read_word_file(src_path), dst_path)
+    print(f"  Compiled {count:,} words: {src_path} -> {dst_path} ({os.path.getsize(dst_path):,} bytes)")
+    return count
+
+
+def find_hunspell_dictionary(language='en_US'):
+    """(dic_path, aff_path) of a Hunspell dictionary - the one bundled with
+    pyenchant (Windows wheels) or a system one - or None"""
+    folders = []
+    spec = importlib.util.find_spec('enchant')
+    if spec is not None and spec.origin:
+        folders.append(os.path.dirname(spec.origin))
+    folders += ['/usr/share/hunspell', '/usr/share/myspell']
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            if f"{language}.dic" in files and f"{language}.aff" in files:
+                return os.path.join(root, f"{language}.dic"), os.path.join(root, f"{language}.aff")
+    return None
+
+
+def read_hunspell_words(dic_path, aff_path):
+    """Every lower-case word a Hunspell dictionary accepts: the .dic entries
+    expanded with the .aff prefix and suffix rules (single-letter flags, as
+    in en_US). Capitalized entries (names, acronyms) are left out, since
+    words are checked in lower case."""
+    rules = {}  # flag -> (kind, cross_product, [(strip, add, condition)])
+    only_in_compound = None
+    with open(aff_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == 'ONLYINCOMPOUND':
+                only_in_compound = parts[1]
+            if len(parts) < 4 or parts[0] not in ('PFX', 'SFX'):
+                continue
+            kind, flag = parts[0], parts[1]
+            if flag not in rules:
+                # Header: PFX <flag> <cross product Y/N> <rule count>
+                rules[flag] = (kind, parts[2] == 'Y', [])
+                continue
+            strip, add = parts[2], parts[3].split('/')[0]
+            condition = parts[4] if len(parts) > 4 else '.'
+            condition = re.compile(f"^{condition}" if kind == 'PFX' else f"{condition}$")
+            rules[flag][2].append(('' if strip == '0' else strip, '' if add == '0' else add, condition))
+    
+    def affixed(word, flags, kind):
+        """(form, cross_product) for each rule of kind that applies to word"""
+        for flag in flags:
+            rule = rules.get(flag)
+            if rule is None or rule[0] != kind:
+                continue
+            for strip, add, condition in rule[2]:
+                if not condition.search(word):
+                    continue
+                if kind == 'SFX' and word.endswith(strip):
+                    yield word[:len(word) - len(strip)] + add, rule[1]
+                elif kind == 'PFX' and word.startswith(strip):
+                    yield add + word[len(strip):], rule[1]
+    
+    words = set()
+    with open(dic_path, 'r', encoding='utf-8') as f:
+        next(f)  # Entry count
+        for line in f:
+            entry = line.split()
+            if not entry:
+                continue
+            word, _, flags = entry[0].partition('/')
+            if only_in_compound and only_in_compound in flags:
+                continue
+            words.add(word)
+            words.update(form for form, _ in affixed(word, flags, 'PFX'))
+            for form, cross in affixed(word, flags, 'SFX'):
+                words.add(form)
+                if cross:
+                    # Prefix + suffix together when both rules allow it
+                    words.update(both for both, prefix_cross in affixed(form, flags, 'PFX') if prefix_cross)
+    return {w for w in words if w == w.lower()}
+
+
+def export_english_words(dst_path=None):
+    """Write english_words.txt (the source of english_keys.bin) from the
+    en_US Hunspell dictionary that pyenchant checks against, so the index
+    accepts the same words as the spell-checker. Returns the word count,
+    0 if no dictionary was found."""
+    dst_path = dst_path or os.path.join(get_script_dir(), 'english_words.txt')
+    found = find_hunspell_dictionary()
+    if found is None:
+        print("  No en_US Hunspell dictionary found - install pyenchant (pip install pyenchant)")
+        return 0
+    words = sorted(read_hunspell_words(*found))
+    with open(dst_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('\n'.join(words) + '\n')
+    print(f"  Exported {len(words):,} words: {found[0]} -> {dst_path}")
+    return len(words)
+
+
+def build_key_indexes():
+    """Build the physical-key indexes (hebrew_keys.bin, english_keys.bin).
+    Each entry is the key spelling that types the word, so the raw key buffer
+    can be probed directly without transliterating it first."""
+    script_dir = get_script_dir()
+    
+    hebrew_txt = os.path.join(script_dir, 'hebrew_words.txt')
+    hebrew_bin = os.path.join(script_dir, 'hebrew_words.bin')
+    if os.path.exists(hebrew_txt):
+        hebrew_words = read_word_file(hebrew_txt)
+    elif os.path.exists(hebrew_bin):
+        hebrew_words = CompiledWordList(hebrew_bin)
+    else:
+        hebrew_words = set()
+        print("  Warning: no Hebrew dictionary found, skipping hebrew_keys.bin")
+    if hebrew_words:
+        keys = {k for k in map(hebrew_to_keys, hebrew_words) if k}
+        dst_path = os.path.join(script_dir, 'hebrew_keys.bin')
+        count = CompiledWordList.compile(keys, dst_path)
+        print(f"  Built Hebrew key index: {count:,} entries -> {dst_path}")
+    
+    english_txt = os.path.join(script_dir, 'english_words.txt')
+    if os.path.exists(english_txt):
+        keys = {w.lower() for w in read_word_file(english_txt) if w.isalpha() and w.isascii()}
+        dst_path = os.path.join(script_dir, 'english_keys.bin')
+        count = CompiledWordList.compile(keys, dst_path)
+        print(f"  Built English key index: {count:,} entries -> {dst_path}")
+
+
+def open_compiled(bin_name, source_name, rebuild_flag):
+    """Open a compiled word list from the script dir if present and not older
+    than its source text file. Returns a CompiledWordList or None."""
+    script_dir = get_script_dir()
+    bin_path = os.path.join(script_dir, bin_name)
+    txt_path = os.path.join(script_dir, source_name)
+    
+    if not os.path.exists(bin_path):
+        return None
+    if os.path.exists(txt_path) and os.path.getmtime(txt_path) > os.path.getmtime(bin_path):
+        print(f"  Warning: {bin_name} is older than {source_name} - run with {rebuild_flag}")
+        return None
+    
+    try:
+        words = CompiledWordList(bin_path)
+        print(f"  Loaded {bin_name}: {len(words):,} entries")
+        return words
+    except Exception as e:
+        print(f"  Error loading {bin_name}: {e}")
+        return None
+
+
+def load_compiled_hebrew_dictionary():
+    """Open hebrew_words.bin if present and up to date"""
+    return open_compiled('hebrew_words.bin', 'hebrew_words.txt', '--compile-dictionary')
+
+
+def load_key_indexes():
+    """Open hebrew_keys.bin / english_keys.bin if present and up to date.
+    Returns (hebrew_key_index, english_key_index), either may be None."""
+    return (open_compiled('hebrew_keys.bin', 'hebrew_words.txt', '--build-index'),
+            open_compiled('english_keys.bin', 'english_words.txt', '--build-index'))
+
+
+def file_stamp(path):
+    """(mtime_ns, size) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def versioned_dictionary_path(dict_path):
+    """hebrew_words.<content hash>.bin next to dict_path - where a compile of
+    its current content goes"""
+    with open(dict_path, 'rb') as f:
+        digest = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    return os.path.join(os.path.dirname(dict_path), f"hebrew_words.{digest}.bin")
+
+
+def load_versioned_hebrew_dictionary(dict_path):
+    """Open the compiled copy of dict_path's current content, compiling it
+    first if there is none.
+    
+    Each compile is a new file named by content hash: Windows can't replace
+    a file while it is mapped (by this instance before a reload, or by
+    another session's), but it can map a new one next to it. Older versions
+    are removed once nothing maps them any more."""
+    bin_path = versioned_dictionary_path(dict_path)
+    if not os.path.exists(bin_path):
+        try:
+            compile_hebrew_dictionary(dict_path, bin_path)
+        except OSError:
+            # Another session compiled the same content first and has it
+            # mapped, so Windows refused to replace it - map theirs
+            if not os.path.exists(bin_path):
+                raise
+        folder, current = os.path.split(bin_path)
+        for name in os.listdir(folder):
+            if name != current and name.startswith('hebrew_words.') and name.endswith('.bin') and name.count('.') == 2:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass  # Still mapped somewhere - removed by a later compile
+    words = CompiledWordList(bin_path)
+    print(f"  Loaded {os.path.basename(bin_path)}: {len(words):,} entries")
+    return words
 
 
 def load_hebrew_dictionary():
-    """Load Hebrew dictionary from hebrew_words.txt"""
+    """Load Hebrew dictionary - compiled hebrew_words.bin if available,
+    otherwise hebrew_words.txt.
+    
+    A missing or out-of-date hebrew_words.bin is not rewritten: the text file
+    is compiled to a versioned file instead (see
+    load_versioned_hebrew_dictionary) if the folder is writable. The compiled
+    file is mapped read-only, so every instance on the machine (one per
+    session on a terminal server) shares the same physical pages instead of
+    building its own set."""
     dict_path = os.path.join(get_script_dir(), 'hebrew_words.txt')
+    bin_path = os.path.join(get_script_dir(), 'hebrew_words.bin')
+    if os.path.exists(bin_path) and not (os.path.exists(dict_path) and
+                                         os.path.getmtime(dict_path) > os.path.getmtime(bin_path)):
+        compiled = load_compiled_hebrew_dictionary()
+        if compiled is not None:
+            return compiled
+    
+    if os.path.exists(dict_path):
+        try:
+            return load_versioned_hebrew_dictionary(dict_path)
+        except Exception as e:
+            print(f"  Could not compile hebrew_words.txt: {e}")
+    
     words = set()
     
     if os.path.exists(dict_path):
         try:
-            with open(dict_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    word = line.strip()
-                    if word:
-                        words.add(word)
+            words = read_word_file(dict_path)
             print(f"  Loaded Hebrew dictionary: {len(words):,} words")
         except Exception as e:
             print(f"  Error loading hebrew_words.txt: {e}")
@@ -146,9 +1307,60 @@ def load_hebrew_dictionary():
 
 
 CONFIG = load_config()
-IGNORED_WORDS = load_ignored_words()
-LEARNED_WORDS = load_learned_words()
-HEBREW_DICTIONARY = load_hebrew_dictionary()
+
+# Word lists are filled by HebrewEnglishSwitcher.load_dictionaries() in the
+# background once the keyboard hook is live. Until then the built-in
+# HEBREW_WORDS / SHORT_HEBREW_WORDS lists are used.
+#
+# A reload (see HebrewEnglishSwitcher.reload_word_files) builds complete new
+# objects and then rebinds these names, so a lookup sees either the old or the
+# new version, never a half-built one. WORD_LISTS_LOCK serializes the
+# ignore/learned file appends with a reload of those files.
+#
+# IGNORED_WORDS and LEARNED_WORDS are the entries of the WordListFile they
+# are loaded from: lower-case word -> None and lower-case keys -> language.
+IGNORED_WORDS = {}
+LEARNED_WORDS = {}
+HEBREW_DICTIONARY = set()
+WORD_LISTS_LOCK = threading.Lock()
+HEBREW_KEY_INDEX = None
+ENGLISH_KEY_INDEX = None
+
+
+# English key to Hebrew character mapping (standard Israeli keyboard)
+ENGLISH_KEY_TO_HEBREW_CHAR = {
+    'q': '/', 'w': "'", 'e': 'ק', 'r': 'ר', 't': 'א',
+    'y': 'ט', 'u': 'ו', 'i': 'ן', 'o': 'ם', 'p': 'פ',
+    'a': 'ש', 's': 'ד', 'd': 'ג', 'f': 'כ', 'g': 'ע',
+    'h': 'י', 'j': 'ח', 'k': 'ל', 'l': 'ך', ';': 'ף',
+    'z': 'ז', 'x': 'ס', 'c': 'ב', 'v': 'ה', 'b': 'נ',
+    'n': 'מ', 'm': 'צ', ',': 'ת', '.': 'ץ', '/': '.',
+}
+
+HEBREW_CHAR_TO_ENGLISH_KEY = {v: k for k, v in ENGLISH_KEY_TO_HEBREW_CHAR.items()}
+
+KEYS_TO_HEBREW_TABLE = str.maketrans(ENGLISH_KEY_TO_HEBREW_CHAR)
+
+
+def keys_to_hebrew(english_keys):
+    """Convert English keys to Hebrew characters"""
+    return english_keys.lower().translate(KEYS_TO_HEBREW_TABLE)
+
+
+def canonical_hebrew_keys(keys):
+    """Key spelling used by the Hebrew key index.
+    The ' key types the same character as W on the Hebrew layout, so both
+    spell the same Hebrew word - normalize to 'w'."""
+    return keys.lower().replace("'", 'w')
+
+
+def hebrew_to_keys(word):
+    """Physical keys that type a Hebrew word (canonical spelling),
+    or None if the word can't be typed on the Hebrew layout"""
+    keys = ''.join(HEBREW_CHAR_TO_ENGLISH_KEY.get(c, c) for c in word)
+    if keys_to_hebrew(keys) != word:
+        return None
+    return keys
 
 
 # Common short English words (2-3 letters) and contractions
@@ -227,22 +1439,1077 @@ HEBREW_WORDS = {
     'בשקט', 'לכולם', 'מידע', 'אהבתי', 'לברוח', 'נשק', 'תחשוב', 'ספק',
 }
 
+# Built-in Hebrew lists by physical-key spelling
+HEBREW_WORDS_KEYS = {k for k in map(hebrew_to_keys, HEBREW_WORDS) if k}
+SHORT_HEBREW_WORDS_KEYS = {k for k in map(hebrew_to_keys, SHORT_HEBREW_WORDS) if k}
 
-class HebrewEnglishSwitcher:
+
+class WordCursor:
+    """Incremental prefix walk over the compiled key indexes.
     
-    # English key to Hebrew character mapping (standard Israeli keyboard)
-    ENGLISH_KEY_TO_HEBREW_CHAR = {
-        'q': '/', 'w': "'", 'e': 'ק', 'r': 'ר', 't': 'א',
-        'y': 'ט', 'u': 'ו', 'i': 'ן', 'o': 'ם', 'p': 'פ',
-        'a': 'ש', 's': 'ד', 'd': 'ג', 'f': 'כ', 'g': 'ע',
-        'h': 'י', 'j': 'ח', 'k': 'ל', 'l': 'ך', ';': 'ף',
-        'z': 'ז', 'x': 'ס', 'c': 'ב', 'v': 'ה', 'b': 'נ',
-        'n': 'מ', 'm': 'צ', ',': 'ת', '.': 'ץ', '/': '.',
-    }
+    Moves forward one key at a time as the word is typed and steps back on
+    Backspace, keeping for every prefix length the range of Hebrew and English
+    index entries that still start with it. When the word ends, whether it is
+    a Hebrew / English word is a read of the saved state instead of a search.
+    Once neither index has a matching entry, further keys are not searched.
+    """
     
-    HEBREW_CHAR_TO_ENGLISH_KEY = {v: k for k, v in ENGLISH_KEY_TO_HEBREW_CHAR.items()}
+    def __init__(self):
+        self.keys = ""
+        self._levels = []  # per typed key: (hebrew_range, hebrew_exact, english_range, english_exact)
+        self._indexes = (None, None)
     
-    # Virtual key codes to English letters (physical key mapping)
+    def reset(self):
+        self.keys = ""
+        self._levels = []
+    
+    @staticmethod
+    def _step(index, rng, prefix):
+        """Narrow rng for the longer prefix. Returns (range, exact) - range is
+        None when the index isn't available, (lo, lo) when no entry matches."""
+        if index is None or rng is None:
+            return None, None
+        lo, hi = rng
+        if lo >= hi:
+            return rng, False
+        prefix = prefix.encode('ascii', 'replace')
+        lo, hi = index.prefix_range(prefix, lo, hi)
+        return (lo, hi), index.is_entry(lo, prefix) if lo < hi else False
+    
+    def push(self, key):
+        hebrew_index, english_index = self._indexes
+        if self._levels:
+            hebrew_range, _, english_range, _ = self._levels[-1]
+        else:
+            hebrew_range = (0, len(hebrew_index)) if hebrew_index is not None else None
+            english_range = (0, len(english_index)) if english_index is not None else None
+        self.keys += key
+        hebrew_range, hebrew_exact = self._step(hebrew_index, hebrew_range, canonical_hebrew_keys(self.keys))
+        english_range, english_exact = self._step(english_index, english_range, self.keys.lower())
+        self._levels.append((hebrew_range, hebrew_exact, english_range, english_exact))
+    
+    def pop(self):
+        if self._levels:
+            self._levels.pop()
+            self.keys = self.keys[:-1]
+    
+    def sync(self, keys):
+        """Bring the cursor in line with the current key buffer - pops back to
+        the common prefix and pushes the rest (usually one key either way)"""
+        indexes = (HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX)
+        if indexes != self._indexes:
+            # Indexes were (re)loaded - start over
+            self._indexes = indexes
+            self.reset()
+        if keys == self.keys:
+            return
+        common = 0
+        limit = min(len(keys), len(self.keys))
+        while common < limit and keys[common] == self.keys[common]:
+            common += 1
+        while len(self.keys) > common:
+            self.pop()
+        for key in keys[common:]:
+            self.push(key)
+    
+    def lookup(self, keys, language):
+        """Saved verdict for keys (a prefix of the tracked buffer): True/False,
+        or None if the cursor can't answer (not tracked, or no index)"""
+        n = len(keys)
+        if n == 0 or n > len(self._levels) or self.keys[:n] != keys:
+            return None
+        hebrew_range, hebrew_exact, english_range, english_exact = self._levels[n - 1]
+        if (HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX) != self._indexes:
+            return None
+        return hebrew_exact if language == 'hebrew' else english_exact
+
+
+def load_template(path):
+    """Grayscale float32 array of an image file"""
+    load_imaging()
+    with PIL_Image.open(path) as image:
+        return np.asarray(image.convert('L'), dtype=np.float32)
+
+
+def downscale2(image):
+    """Half-size image (2x2 block mean)"""
+    h, w = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    return image[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+
+
+def normalized_correlation(image, template):
+    """Normalized correlation map (OpenCV TM_CCOEFF_NORMED) of template over
+    every position in image. Uses OpenCV when installed, otherwise an FFT
+    cross-correlation with integral-image window statistics in NumPy."""
+    load_imaging()
+    if cv2 is not None:
+        return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    
+    th, tw = template.shape
+    h, w = image.shape
+    t = template.astype(np.float64) - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+    img = image.astype(np.float64)
+    
+    # Sum of image * zero-mean template over each window (circular correlation,
+    # valid positions never wrap)
+    spectrum = np.fft.rfft2(img) * np.conj(np.fft.rfft2(t, s=img.shape))
+    numerator = np.fft.irfft2(spectrum, s=img.shape)[:h - th + 1, :w - tw + 1]
+    
+    # Window variance from integral images
+    def window_sums(a):
+        integral = np.pad(a.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        return integral[th:, tw:] - integral[:-th, tw:] - integral[th:, :-tw] + integral[:-th, :-tw]
+    n = th * tw
+    sums = window_sums(img)
+    variance = np.maximum(window_sums(img * img) - sums * sums / n, 0)
+    denominator = np.sqrt(variance) * t_norm
+    
+    result = np.zeros_like(numerator)
+    valid = denominator > 1e-6 * max(t_norm, 1)
+    result[valid] = numerator[valid] / denominator[valid]
+    return result
+
+
+class ButtonLocator:
+    """
+    Finds a ribbon button (align_left.png / align_right.png) on screen.
+    
+    A search captures only the ribbon strip of the window once and computes
+    one correlation map - at half resolution, then refined at full resolution
+    around the best few candidates - and the confidence thresholds are applied
+    to that single result. The last hit per window rectangle is remembered and
+    re-checked with a template-sized capture before searching again.
+    """
+    
+    THRESHOLDS = (0.9, 0.8, 0.7, 0.6, 0.5)
+    RIBBON_HEIGHT = 250   # Pixels from the top of the window that are searched
+    CANDIDATES = 3        # Coarse peaks refined at full resolution
+    
+    def __init__(self, backend, image_path):
+        self.backend = backend
+        self.image_path = image_path
+        self._template = None
+        self._template_small = None
+        self._hits = {}  # window rect -> (left, top, confidence)
+    
+    def _load(self):
+        if self._template is None:
+            self._template = load_template(self.image_path)
+            small = downscale2(self._template)
+            self._template_small = small if min(small.shape) >= 8 else None
+    
+    def _threshold(self, score):
+        """Highest confidence level the score reaches, or None"""
+        for threshold in self.THRESHOLDS:
+            if score >= threshold:
+                return threshold
+        return None
+    
+    def search(self, image):
+        """Best match of the template in a grayscale image.
+        Returns (x, y, score) - top-left corner in image coordinates."""
+        self._load()
+        template = self._template
+        th, tw = template.shape
+        if image.shape[0] < th or image.shape[1] < tw:
+            return None
+        
+        if self._template_small is None or min(image.shape) < 2 * max(th, tw):
+            scores = normalized_correlation(image, template)
+            y, x = np.unravel_index(np.argmax(scores), scores.shape)
+            return int(x), int(y), float(scores[y, x])
+        
+        # Coarse pass at half resolution
+        coarse = normalized_correlation(downscale2(image), self._template_small)
+        order = np.argsort(coarse, axis=None)[::-1]
+        
+        # Refine the best distinct peaks in a small full-resolution window
+        best = None
+        refined = []
+        margin = 3
+        for flat in order:
+            cy, cx = np.unravel_index(flat, coarse.shape)
+            if any(abs(cy - py) <= 2 and abs(cx - px) <= 2 for py, px in refined):
+                continue
+            refined.append((cy, cx))
+            top = max(0, 2 * cy - margin)
+            left = max(0, 2 * cx - margin)
+            patch = image[top:2 * cy + th + margin, left:2 * cx + tw + margin]
+            if patch.shape[0] < th or patch.shape[1] < tw:
+                continue
+            scores = normalized_correlation(patch, template)
+            y, x = np.unravel_index(np.argmax(scores), scores.shape)
+            if best is None or scores[y, x] > best[2]:
+                best = (int(left + x), int(top + y), float(scores[y, x]))
+            if len(refined) >= self.CANDIDATES:
+                break
+        return best
+    
+    def locate(self, hwnd):
+        """
+        Find the button in a window.
+        Returns ((left, top, width, height), confidence) in screen coordinates,
+        or (None, None) if it isn't found at the lowest confidence level.
+        """
+        self._load()
+        th, tw = self._template.shape
+        rect = self.backend.window_rect(hwnd)
+        left, top, right, bottom = rect
+        
+        # Cheap check of the last hit in this window first
+        hit = self._hits.get(rect)
+        if hit:
+            x, y, confidence = hit
+            patch = self.backend.capture_gray((x, y, x + tw, y + th))
+            if patch is not None and patch.shape == self._template.shape:
+                if float(normalized_correlation(patch, self._template)[0, 0]) >= confidence:
+                    return (x, y, tw, th), confidence
+            del self._hits[rect]
+        
+        ribbon = (left, top, right, min(bottom, top + self.RIBBON_HEIGHT))
+        image = self.backend.capture_gray(ribbon)
+        if image is None:
+            return None, None
+        match = self.search(image)
+        if match is None:
+            return None, None
+        x, y, score = match
+        confidence = self._threshold(score)
+        if confidence is None:
+            return None, None
+        x, y = ribbon[0] + x, ribbon[1] + y
+        self._hits[rect] = (x, y, confidence)
+        return (x, y, tw, th), confidence
+
+
+# SendInput structures (winuser.h). MOUSEINPUT is only here so INPUT has its real size.
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", ctypes.c_ushort),
+        ("wScan", ctypes.c_ushort),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class INPUT(ctypes.Structure):
+    class _Union(ctypes.Union):
+        _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+    _anonymous_ = ("union",)
+    _fields_ = [("type", ctypes.c_ulong), ("union", _Union)]
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [("biSize", ctypes.c_ulong),
+                ("biWidth", ctypes.c_long),
+                ("biHeight", ctypes.c_long),
+                ("biPlanes", ctypes.c_ushort),
+                ("biBitCount", ctypes.c_ushort),
+                ("biCompression", ctypes.c_ulong),
+                ("biSizeImage", ctypes.c_ulong),
+                ("biXPelsPerMeter", ctypes.c_long),
+                ("biYPelsPerMeter", ctypes.c_long),
+                ("biClrUsed", ctypes.c_ulong),
+                ("biClrImportant", ctypes.c_ulong)]
+
+
+class PROCESS_MEMORY_COUNTERS_EX(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong),
+                ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+                ("PrivateUsage", ctypes.c_size_t)]
+
+
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+VK_BACK = 0x08
+VK_TAB = 0x09
+VK_RETURN = 0x0D
+LLKHF_INJECTED = 0x10
+LLMHF_INJECTED = 0x01
+
+# Characters typed as their key rather than as Unicode text
+TEXT_KEYS = {'\n': VK_RETURN, '\t': VK_TAB}
+
+
+def replacement_inputs(delete_count, text):
+    """INPUT array for delete_count backspaces followed by text typed as
+    Unicode (KEYEVENTF_UNICODE) - independent of the active layout and
+    Caps Lock. Newline and tab are sent as Enter and Tab. Characters
+    outside the BMP are sent as surrogate pairs."""
+    events = []
+    for _ in range(delete_count):
+        events.append((VK_BACK, 0, 0))
+        events.append((VK_BACK, 0, KEYEVENTF_KEYUP))
+    for char in text:
+        if char in TEXT_KEYS:
+            events.append((TEXT_KEYS[char], 0, 0))
+            events.append((TEXT_KEYS[char], 0, KEYEVENTF_KEYUP))
+            continue
+        units = char.encode('utf-16-le')
+        for i in range(0, len(units), 2):
+            unit = units[i] | units[i + 1] << 8
+            events.append((0, unit, KEYEVENTF_UNICODE))
+            events.append((0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+    
+    inputs = (INPUT * len(events))()
+    for item, (vk, scan, flags) in zip(inputs, events):
+        item.type = INPUT_KEYBOARD
+        item.ki.wVk = vk
+        item.ki.wScan = scan
+        item.ki.dwFlags = flags
+    return inputs
+
+
+class WindowsBackend:
+    """Everything the switcher does to the OS: focus, layout switching, key
+    injection, input blocking, Caps Lock, hotkeys, listeners and session events.
+    FakeBackend implements the same methods in memory."""
+    
+    WM_INPUTLANGCHANGEREQUEST = 0x0050
+    WM_NULL = 0x0000
+    WM_QUIT = 0x0012
+    SMTO_ABORTIFHUNG = 0x0002
+    
+    # WinEvents for start_foreground_watch()
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    OBJID_WINDOW = 0
+    
+    # BitBlt raster operations for capture_gray()
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+    
+    # Virtual key codes for keys_down()
+    KEY_CODES = {'ctrl': 0x11, 'shift': 0x10, 'alt': 0x12, '`': 0xC0}
+    
+    def __init__(self):
+        self._block_input = ctypes.windll.user32.BlockInput
+        self._block_input.argtypes = [ctypes.c_bool]
+        self._block_input.restype = ctypes.c_bool
+        self._send_input = ctypes.windll.user32.SendInput
+        self._send_input.argtypes = [ctypes.c_uint, ctypes.c_void_p, ctypes.c_int]
+        self._send_input.restype = ctypes.c_uint
+        self._listeners = []
+        self._foreground_thread_id = None
+        self.foreground_watched = False  # True while the WinEvent hooks are installed
+        self._session_thread_id = None
+        self._directory_stop = None
+        self.wakeups = Counter()  # Messages handled per message loop - 0 while the machine is idle
+    
+    def foreground_window(self):
+        return win32gui.GetForegroundWindow()
+    
+    def window_title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+    
+    def request_layout(self, hwnd, layout_id):
+        win32api.PostMessage(hwnd, self.WM_INPUTLANGCHANGEREQUEST, 0, layout_id)
+    
+    def window_layout(self, hwnd):
+        """Language id (low word of the HKL) of the window's input thread"""
+        thread_id = ctypes.windll.user32.GetWindowThreadProcessId(hwnd, None)
+        return ctypes.windll.user32.GetKeyboardLayout(thread_id) & 0xFFFF
+    
+    def input_idle(self, hwnd, timeout_ms=50):
+        """True once the window's thread is back in its message loop
+        (SendMessageTimeout WM_NULL). This is a heuristic: it shows the thread
+        pumped messages, which usually means it has taken the input queued
+        before this call, but an app that handles keys on another thread or
+        defers them to a later message can still be behind."""
+        result = ctypes.c_size_t()
+        return bool(ctypes.windll.user32.SendMessageTimeoutW(
+            hwnd, self.WM_NULL, 0, 0, self.SMTO_ABORTIFHUNG, timeout_ms, ctypes.byref(result)))
+    
+    def keys_down(self, names):
+        """The physically held keys among names ('ctrl', 'shift', 'alt', '`')"""
+        return [name for name in names
+                if ctypes.windll.user32.GetAsyncKeyState(self.KEY_CODES[name]) & 0x8000]
+    
+    def send_key(self, name):
+        keyboard.send(name)
+    
+    def replace_text(self, delete_count, text):
+        """Erase delete_count characters and type text in one SendInput call.
+        Returns the number of input events the OS accepted."""
+        inputs = replacement_inputs(delete_count, text)
+        if not len(inputs):
+            return 0
+        return self._send_input(len(inputs), inputs, ctypes.sizeof(INPUT))
+    
+    def press_key(self, name):
+        keyboard.press(name)
+    
+    def release_key(self, name):
+        keyboard.release(name)
+    
+    def block_input(self, block):
+        return self._block_input(block)
+    
+    def is_caps_lock_on(self):
+        return bool(ctypes.windll.user32.GetKeyState(0x14) & 0x0001)
+    
+    def now(self):
+        return time.time()
+    
+    def sleep(self, seconds):
+        time.sleep(seconds)
+    
+    def add_hotkey(self, combo, callback):
+        keyboard.add_hotkey(combo, callback)
+    
+    def start_listeners(self, on_press, on_release, on_click):
+        """Start the hooks. Injected input (our own fixes) never reaches the callbacks."""
+        mouse_listener = pynput_mouse.Listener(
+            on_click=on_click,
+            win32_event_filter=lambda msg, data: not (data.flags & LLMHF_INJECTED))
+        keyboard_listener = pynput_keyboard.Listener(
+            on_press=on_press, on_release=on_release,
+            win32_event_filter=lambda msg, data: not (data.flags & LLKHF_INJECTED))
+        mouse_listener.start()
+        keyboard_listener.start()
+        self._listeners = [keyboard_listener, mouse_listener]
+    
+    def stop_listeners(self):
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+    
+    def start_foreground_watch(self, on_change):
+        """Call on_change(hwnd, title) whenever the foreground window or its
+        title changes. Runs a WinEvent hook on its own message-loop thread.
+        foreground_watched stays False if the hooks can't be installed."""
+        threading.Thread(target=self._foreground_loop, args=(on_change,), daemon=True).start()
+    
+    def stop_foreground_watch(self):
+        if self._foreground_thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._foreground_thread_id, self.WM_QUIT, 0, 0)
+            self._foreground_thread_id = None
+    
+    def _foreground_loop(self, on_change):
+        from ctypes import wintypes
+        
+        user32 = ctypes.windll.user32
+        WINEVENTPROC = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WINEVENTPROC,
+                                           wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        foreground = [user32.GetForegroundWindow()]
+        
+        def callback(hook, event, hwnd, id_object, id_child, thread_id, time_ms):
+            try:
+                if id_object != self.OBJID_WINDOW or id_child != 0 or not hwnd:
+                    return
+                if event == self.EVENT_SYSTEM_FOREGROUND:
+                    foreground[0] = hwnd
+                elif hwnd != foreground[0]:
+                    return  # Title change of a background window
+                on_change(hwnd, win32gui.GetWindowText(hwnd))
+            except Exception as e:
+                print(f"  [Foreground watch error: {e}]")
+        
+        # Keep reference to prevent garbage collection
+        self._win_event_proc = WINEVENTPROC(callback)
+        self._foreground_thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        hooks = [user32.SetWinEventHook(event, event, None, self._win_event_proc, 0, 0, self.WINEVENT_OUTOFCONTEXT)
+                 for event in (self.EVENT_SYSTEM_FOREGROUND, self.EVENT_OBJECT_NAMECHANGE)]
+        
+        if all(hooks):
+            # Out-of-context WinEvents are delivered through this thread's message queue
+            self.foreground_watched = True
+            msg = wintypes.MSG()
+            while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                self.wakeups['foreground'] += 1
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+            self.foreground_watched = False
+        else:
+            print(f"  WARNING: SetWinEventHook failed (error {ctypes.windll.kernel32.GetLastError()}) - "
+                  f"the foreground window will be checked before each fix instead")
+        
+        for hook in hooks:
+            if hook:
+                user32.UnhookWinEvent(hook)
+    
+    def window_rect(self, hwnd):
+        """(left, top, right, bottom) of a window in screen coordinates"""
+        return tuple(win32gui.GetWindowRect(hwnd))
+    
+    def capture_gray(self, box):
+        """Grayscale float32 NumPy screenshot of box (left, top, right, bottom)
+        in virtual-screen coordinates. Only the box is copied (BitBlt from the
+        screen DC); parts outside every monitor come back black."""
+        load_imaging()
+        left, top, right, bottom = box
+        width, height = right - left, bottom - top
+        if width <= 0 or height <= 0:
+            return None
+        
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        user32.GetDC.restype = ctypes.c_void_p
+        user32.ReleaseDC.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        gdi32.CreateCompatibleDC.argtypes = [ctypes.c_void_p]
+        gdi32.CreateCompatibleDC.restype = ctypes.c_void_p
+        gdi32.CreateCompatibleBitmap.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        gdi32.CreateCompatibleBitmap.restype = ctypes.c_void_p
+        gdi32.SelectObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        gdi32.SelectObject.restype = ctypes.c_void_p
+        gdi32.BitBlt.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                 ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        gdi32.GetDIBits.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint,
+                                    ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint]
+        gdi32.DeleteObject.argtypes = [ctypes.c_void_p]
+        gdi32.DeleteDC.argtypes = [ctypes.c_void_p]
+        
+        screen_dc = user32.GetDC(None)
+        memory_dc = gdi32.CreateCompatibleDC(screen_dc)
+        bitmap = gdi32.CreateCompatibleBitmap(screen_dc, width, height)
+        pixels = ctypes.create_string_buffer(width * height * 4)
+        try:
+            previous = gdi32.SelectObject(memory_dc, bitmap)
+            gdi32.BitBlt(memory_dc, 0, 0, width, height, screen_dc, left, top, self.SRCCOPY | self.CAPTUREBLT)
+            gdi32.SelectObject(memory_dc, previous)
+            # Top-down 32-bit BGRX rows
+            header = BITMAPINFOHEADER(biSize=ctypes.sizeof(BITMAPINFOHEADER), biWidth=width, biHeight=-height,
+                                      biPlanes=1, biBitCount=32, biCompression=0)
+            copied = gdi32.GetDIBits(memory_dc, bitmap, 0, height, pixels, ctypes.byref(header), 0)
+        finally:
+            gdi32.DeleteObject(bitmap)
+            gdi32.DeleteDC(memory_dc)
+            user32.ReleaseDC(None, screen_dc)
+        if copied != height:
+            return None
+        
+        bgrx = np.frombuffer(pixels.raw, dtype=np.uint8).reshape(height, width, 4).astype(np.float32)
+        # Same luma weights as PIL's convert('L')
+        return bgrx[..., 2] * 0.299 + bgrx[..., 1] * 0.587 + bgrx[..., 0] * 0.114
+    
+    def click_point(self, x, y):
+        win32api.SetCursorPos((x, y))
+        win32api.mouse_event(0x0002, 0, 0, 0, 0)  # MOUSEEVENTF_LEFTDOWN
+        win32api.mouse_event(0x0004, 0, 0, 0, 0)  # MOUSEEVENTF_LEFTUP
+    
+    def message_box(self, text, title):
+        ctypes.windll.user32.MessageBoxW(0, text, title, 0x40)  # MB_ICONINFORMATION
+    
+    def process_memory(self):
+        """(private bytes, working set bytes) of this process, or None"""
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        kernel32.K32GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_ulong]
+        counters = PROCESS_MEMORY_COUNTERS_EX()
+        counters.cb = ctypes.sizeof(counters)
+        if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PrivateUsage, counters.WorkingSetSize
+    
+    def watch_session_events(self, on_event, log, warn):
+        """Call on_event('unlock' / 'logon' / 'lock' / 'resume') for session and
+        power events until stop_session_events(). Blocks - run in a thread.
+        log() receives diagnostics for the log file, warn() setup failures."""
+        from ctypes import wintypes, Structure, WINFUNCTYPE, c_int, c_void_p, c_wchar_p, POINTER
+        
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+        wtsapi32 = ctypes.windll.wtsapi32
+        
+        # Set up DefWindowProcW properly for 64-bit
+        user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+        user32.DefWindowProcW.restype = ctypes.c_longlong
+        
+        # Window messages
+        WM_WTSSESSION_CHANGE = 0x02B1
+        WM_POWERBROADCAST = 0x0218
+        
+        # Session notification types
+        WTS_SESSION_LOCK = 0x7
+        WTS_SESSION_UNLOCK = 0x8
+        WTS_SESSION_LOGON = 0x5
+        WTS_SESSION_LOGOFF = 0x6
+        
+        # Power events
+        PBT_APMRESUMEAUTOMATIC = 0x0012
+        PBT_APMRESUMESUSPEND = 0x0007
+        
+        # Notification flags
+        NOTIFY_FOR_THIS_SESSION = 0
+        
+        # Define WNDCLASSEXW structure
+        class WNDCLASSEXW(Structure):
+            _fields_ = [
+                ("cbSize", wintypes.UINT),
+                ("style", wintypes.UINT),
+                ("lpfnWndProc", c_void_p),
+                ("cbClsExtra", c_int),
+                ("cbWndExtra", c_int),
+                ("hInstance", wintypes.HINSTANCE),
+                ("hIcon", wintypes.HICON),
+                ("hCursor", wintypes.HICON),
+                ("hbrBackground", wintypes.HBRUSH),
+                ("lpszMenuName", c_wchar_p),
+                ("lpszClassName", c_wchar_p),
+                ("hIconSm", wintypes.HICON),
+            ]
+        
+        # Use platform-appropriate types for WPARAM and LPARAM (64-bit on 64-bit Windows)
+        if ctypes.sizeof(c_void_p) == 8:  # 64-bit
+            WNDPROC = WINFUNCTYPE(ctypes.c_longlong, ctypes.c_void_p, wintypes.UINT, ctypes.c_ulonglong, ctypes.c_longlong)
+        else:  # 32-bit
+            WNDPROC = WINFUNCTYPE(ctypes.c_long, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+        
+        def wnd_proc(hwnd, msg, wparam, lparam):
+            try:
+                if msg == WM_WTSSESSION_CHANGE:
+                    log(f"SESSION_MONITOR: WM_WTSSESSION_CHANGE received, wparam={wparam}")
+                    if wparam == WTS_SESSION_UNLOCK:
+                        on_event('unlock')
+                    elif wparam == WTS_SESSION_LOGON:
+                        on_event('logon')
+                    elif wparam == WTS_SESSION_LOCK:
+                        on_event('lock')
+                
+                elif msg == WM_POWERBROADCAST:
+                    log(f"SESSION_MONITOR: WM_POWERBROADCAST received, wparam={wparam}")
+                    if wparam in (PBT_APMRESUMEAUTOMATIC, PBT_APMRESUMESUSPEND):
+                        on_event('resume')
+            except Exception as e:
+                log(f"SESSION_MONITOR: Error in wnd_proc: {e}")
+            
+            return user32.DefWindowProcW(hwnd, msg, wparam, lparam)
+        
+        # Keep reference to prevent garbage collection
+        self._wnd_proc_cb = WNDPROC(wnd_proc)
+        
+        # Get module handle
+        hInstance = kernel32.GetModuleHandleW(None)
+        
+        # Use unique class name
+        import random
+        class_name = f"SessionMonitor_{random.randint(10000, 99999)}"
+        
+        # Register window class using WNDCLASSEXW
+        wc = WNDCLASSEXW()
+        wc.cbSize = ctypes.sizeof(WNDCLASSEXW)
+        wc.lpfnWndProc = ctypes.cast(self._wnd_proc_cb, c_void_p)
+        wc.lpszClassName = class_name
+        wc.hInstance = hInstance
+        
+        atom = user32.RegisterClassExW(ctypes.byref(wc))
+        if not atom:
+            error = kernel32.GetLastError()
+            warn(f"  [Warning: Could not register session monitor class, error={error}]")
+            log(f"SESSION_MONITOR: FAILED to register class, error={error}")
+            return
+        
+        # Create a hidden window (not message-only, WTS needs a real window)
+        hwnd = user32.CreateWindowExW(
+            0,                      # dwExStyle
+            class_name,             # lpClassName  
+            "SessionMonitor",       # lpWindowName
+            0,                      # dwStyle (no visible style)
+            0, 0, 0, 0,            # x, y, width, height
+            None,                   # hWndParent (None = top-level)
+            None,                   # hMenu
+            hInstance,              # hInstance
+            None                    # lpParam
+        )
+        
+        if not hwnd:
+            error = kernel32.GetLastError()
+            warn(f"  [Warning: Could not create session monitor window, error={error}]")
+            log(f"SESSION_MONITOR: FAILED to create window, error={error}")
+            return
+        
+        # Register for session notifications
+        if not wtsapi32.WTSRegisterSessionNotification(hwnd, NOTIFY_FOR_THIS_SESSION):
+            error = kernel32.GetLastError()
+            warn(f"  [Warning: Could not register for session notifications, error={error}]")
+            log(f"SESSION_MONITOR: FAILED to register session notifications, error={error}")
+            user32.DestroyWindow(hwnd)
+            return
+        
+        warn("  [Session monitor started - will reset to English on unlock/logon]")
+        log("SESSION_MONITOR: Started successfully, listening for unlock/logon events")
+        
+        # Message loop - GetMessage sleeps until a message arrives; stop_session_events()
+        # posts WM_QUIT to end it
+        self._session_thread_id = kernel32.GetCurrentThreadId()
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            self.wakeups['session'] += 1
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        
+        # Cleanup
+        wtsapi32.WTSUnRegisterSessionNotification(hwnd)
+        user32.DestroyWindow(hwnd)
+    
+    def stop_session_events(self):
+        if self._session_thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._session_thread_id, self.WM_QUIT, 0, 0)
+            self._session_thread_id = None
+    
+    def watch_directory(self, path, on_change):
+        """Call on_change() whenever a file in path is created, written, renamed
+        or deleted, until stop_directory_watch(). Blocks - run in a thread."""
+        FILE_NOTIFY_CHANGE_FILE_NAME = 0x0001
+        FILE_NOTIFY_CHANGE_SIZE = 0x0008
+        FILE_NOTIFY_CHANGE_LAST_WRITE = 0x0010
+        INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+        WAIT_OBJECT_0 = 0
+        INFINITE = 0xFFFFFFFF
+        
+        kernel32 = ctypes.windll.kernel32
+        kernel32.FindFirstChangeNotificationW.restype = ctypes.c_void_p
+        kernel32.FindNextChangeNotification.argtypes = [ctypes.c_void_p]
+        kernel32.FindCloseChangeNotification.argtypes = [ctypes.c_void_p]
+        kernel32.CreateEventW.restype = ctypes.c_void_p
+        kernel32.SetEvent.argtypes = [ctypes.c_void_p]
+        kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+        kernel32.WaitForMultipleObjects.argtypes = [ctypes.c_ulong, ctypes.c_void_p, ctypes.c_int, ctypes.c_ulong]
+        kernel32.WaitForMultipleObjects.restype = ctypes.c_ulong
+        
+        change = kernel32.FindFirstChangeNotificationW(
+            path, False, FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_SIZE | FILE_NOTIFY_CHANGE_LAST_WRITE)
+        if not change or change == INVALID_HANDLE_VALUE:
+            print(f"  [Warning: Could not watch {path} for word list changes]")
+            return
+        stop = kernel32.CreateEventW(None, True, False, None)
+        self._directory_stop = stop
+        handles = (ctypes.c_void_p * 2)(change, stop)
+        try:
+            # Sleeps until the directory changes or stop is set
+            while kernel32.WaitForMultipleObjects(2, handles, False, INFINITE) == WAIT_OBJECT_0:
+                self.wakeups['directory'] += 1
+                on_change()
+                if not kernel32.FindNextChangeNotification(change):
+                    break
+        finally:
+            kernel32.FindCloseChangeNotification(change)
+            self._directory_stop = None
+            kernel32.CloseHandle(stop)
+    
+    def stop_directory_watch(self):
+        if self._directory_stop:
+            ctypes.windll.kernel32.SetEvent(self._directory_stop)
+    
+
+
+class FakeBackend:
+    """In-memory backend for running the switcher headless (replay, profiling,
+    load tests on any OS).
+    
+    Nothing reaches the OS: injected input is appended to `events` as
+    (virtual_time, action, value), `calls` counts every backend call by name,
+    and sleep() advances the virtual clock instead of blocking.
+    """
+    
+    def __init__(self, window=1, title=''):
+        self.clock = 0.0
+        self.window = window
+        self.titles = {window: title}
+        self.caps_lock = False
+        self.input_blocked = False
+        self.layout = None
+        self.held_keys = set()    # Keys the "user" is holding, for keys_down()
+        self.events = []
+        self.calls = Counter()
+        self.hotkeys = {}
+        self.listeners = None
+        self.session_callback = None
+        self.foreground_callback = None
+        self.foreground_watched = False  # Set False after start_foreground_watch() to act like a failed hook
+        self.directory_callback = None
+        self.wakeups = Counter()  # Same as WindowsBackend.wakeups - nothing loops here
+        self.screen = None        # Grayscale NumPy array used as the screen by capture_gray()
+        self.window_rects = {}    # hwnd -> (left, top, right, bottom)
+    
+    def _inject(self, action, value=None):
+        self.calls[action] += 1
+        self.events.append((self.clock, action, value))
+    
+    def foreground_window(self):
+        self.calls['foreground_window'] += 1
+        return self.window
+    
+    def window_title(self, hwnd):
+        self.calls['window_title'] += 1
+        return self.titles.get(hwnd, '')
+    
+    def request_layout(self, hwnd, layout_id):
+        self.layout = layout_id
+        self._inject('request_layout', layout_id)
+    
+    def window_layout(self, hwnd):
+        self.calls['window_layout'] += 1
+        return self.layout
+    
+    def input_idle(self, hwnd, timeout_ms=50):
+        self.calls['input_idle'] += 1
+        return True
+    
+    def keys_down(self, names):
+        self.calls['keys_down'] += 1
+        return [name for name in names if name in self.held_keys]
+    
+    def send_key(self, name):
+        if name == 'caps lock':
+            self.caps_lock = not self.caps_lock
+        self._inject('send_key', name)
+    
+    def replace_text(self, delete_count, text):
+        self._inject('replace_text', (delete_count, text))
+        return len(replacement_inputs(delete_count, text))
+    
+    def press_key(self, name):
+        self._inject('press_key', name)
+    
+    def release_key(self, name):
+        self._inject('release_key', name)
+    
+    def block_input(self, block):
+        self.input_blocked = block
+        self._inject('block_input', block)
+        return True
+    
+    def is_caps_lock_on(self):
+        self.calls['is_caps_lock_on'] += 1
+        return self.caps_lock
+    
+    def now(self):
+        return self.clock
+    
+    def sleep(self, seconds):
+        self.calls['sleep'] += 1
+        self.clock += seconds
+    
+    def add_hotkey(self, combo, callback):
+        self.hotkeys[combo] = callback
+    
+    def start_listeners(self, on_press, on_release, on_click):
+        self.listeners = (on_press, on_release, on_click)
+    
+    def stop_listeners(self):
+        self.listeners = None
+    
+    def start_foreground_watch(self, on_change):
+        self.foreground_callback = on_change
+        self.foreground_watched = True
+    
+    def stop_foreground_watch(self):
+        self.foreground_callback = None
+        self.foreground_watched = False
+    
+    def set_foreground(self, hwnd, title=None):
+        """Bring hwnd to the front (and/or retitle it), notifying the foreground watch"""
+        changed = hwnd != self.window or (title is not None and title != self.titles.get(hwnd, ''))
+        self.window = hwnd
+        if title is not None:
+            self.titles[hwnd] = title
+        if changed and self.foreground_callback:
+            self.foreground_callback(hwnd, self.titles.get(hwnd, ''))
+    
+    def window_rect(self, hwnd):
+        self.calls['window_rect'] += 1
+        return self.window_rects.get(hwnd, (0, 0, 0, 0))
+    
+    def capture_gray(self, box):
+        """Crop of the synthetic `screen` array (None if no screen is set).
+        Like the real capture, parts of box off the screen come back black,
+        so the crop is always box-sized and its (0, 0) is box's corner."""
+        self.calls['capture_gray'] += 1
+        if self.screen is None:
+            return None
+        left, top, right, bottom = box
+        if right <= left or bottom <= top:
+            return None
+        height, width = self.screen.shape
+        crop = np.zeros((bottom - top, right - left), dtype=np.float32)
+        src_top, src_left = max(top, 0), max(left, 0)
+        src = self.screen[src_top:max(src_top, min(bottom, height)), src_left:max(src_left, min(right, width))]
+        crop[src_top - top:src_top - top + src.shape[0], src_left - left:src_left - left + src.shape[1]] = src
+        return crop
+    
+    def click_point(self, x, y):
+        self._inject('click', (x, y))
+    
+    def message_box(self, text, title):
+        self._inject('message_box', title)
+    
+    def process_memory(self):
+        return None
+    
+    def watch_session_events(self, on_event, log, warn):
+        self.session_callback = on_event
+    
+    def stop_session_events(self):
+        self.session_callback = None
+    
+    def watch_directory(self, path, on_change):
+        self.directory_callback = on_change
+    
+    def stop_directory_watch(self):
+        self.directory_callback = None
+    
+    def fire_directory_change(self):
+        """Report a change in the watched directory"""
+        if self.directory_callback:
+            self.directory_callback()
+    
+    def fire_session_event(self, event):
+        """Deliver a session event ('unlock', 'logon', 'lock', 'resume')"""
+        if self.session_callback:
+            self.session_callback(event)
+    
+    def press_hotkey(self, combo):
+        self.hotkeys[combo]()
+    
+    def os_calls(self):
+        """Total backend calls, not counting sleeps"""
+        return sum(count for name, count in self.calls.items() if name != 'sleep')
+
+
+class FixWorker:
+    """
+    The one thread that runs the switcher's output actions - fixes, undo,
+    force-fix and first-word direction - in the order they were submitted.
+    
+    Nothing is dropped: an action submitted while another runs waits in the
+    queue. Fixes that are waiting back to back are merged into a single
+    fix_words() call, so they go out as one replace_text() batch.
+    Queue wait is recorded as the 'queue_wait' latency stage.
+    """
+    
+    def __init__(self, switcher):
+        self.switcher = switcher
+        self.submitted = 0
+        self.merged = 0         # Fixes that went out in another fix's batch
+        self.max_depth = 0
+        self.outstanding = 0    # Fixes queued or running
+        self._jobs = deque()    # (action, args, queued_at)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+    
+    def submit(self, action, *args):
+        with self._cond:
+            self._jobs.append((action, args, self.switcher.backend.now()))
+            self.submitted += 1
+            if action == self.switcher.fix_words:
+                self.outstanding += len(args[0])
+            self.max_depth = max(self.max_depth, len(self._jobs))
+            self._cond.notify()
+    
+    def depth(self):
+        return len(self._jobs)
+    
+    def next_queued_at(self):
+        """Submit time of the oldest waiting action, or None"""
+        with self._cond:
+            return self._jobs[0][2] if self._jobs else None
+    
+    def queued_fixes(self):
+        """Fix jobs still waiting, oldest first"""
+        with self._cond:
+            return [job for action, args, _ in self._jobs if action == self.switcher.fix_words for job in args[0]]
+    
+    def take(self):
+        """Pop the next action, merging the fixes queued right behind a fix.
+        A fix is only merged if the text typed before it is known and it
+        doesn't start a new line."""
+        with self._cond:
+            if not self._jobs:
+                return None
+            action, args, queued_at = self._jobs.popleft()
+            if action == self.switcher.fix_words:
+                jobs = list(args[0])
+                while self._jobs and self._jobs[0][0] == action:
+                    following = self._jobs[0][1][0][0]
+                    if following['gap'] is None or following['is_first'] or '\n' in following['gap']:
+                        break
+                    jobs.extend(self._jobs.popleft()[1][0])
+                    self.merged += 1
+                args = (jobs,)
+            return action, args, queued_at
+    
+    def run_next(self):
+        """Run the next action on the calling thread. Returns what ran
+        (action, args, queued_at), or None if the queue was empty."""
+        job = self.take()
+        if job is None:
+            return None
+        action, args, queued_at = job
+        self.switcher.latency.record('queue_wait', self.switcher.backend.now() - queued_at)
+        try:
+            # Switching the layout and the waits go to the cached foreground window
+            self.switcher.refresh_foreground()
+            action(*args)
+        except Exception as e:
+            print(f"  [Action {action.__name__} failed: {e}]")
+        finally:
+            if action == self.switcher.fix_words:
+                with self._cond:
+                    self.outstanding -= len(args[0])
+        return job
+    
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=2.0):
+        """Finish what is queued, then stop the thread"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._stopping:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+            self.run_next()
+    
+    def stats(self):
+        return f"{self.submitted:,} actions, {self.merged:,} fixes merged, max queue depth {self.max_depth}"
+
+
+class HebrewEnglishSwitcher:
+    
+    # English key to Hebrew character mapping (standard Israeli keyboard)
+    ENGLISH_KEY_TO_HEBREW_CHAR = ENGLISH_KEY_TO_HEBREW_CHAR
+    HEBREW_CHAR_TO_ENGLISH_KEY = HEBREW_CHAR_TO_ENGLISH_KEY
+    
+    # Virtual key codes to English letters (physical key mapping)
     VK_TO_ENGLISH = {
         65: 'a', 66: 'b', 67: 'c', 68: 'd', 69: 'e', 70: 'f', 71: 'g', 72: 'h',
         73: 'i', 74: 'j', 75: 'k', 76: 'l', 77: 'm', 78: 'n', 79: 'o', 80: 'p',
@@ -256,52 +2523,79 @@ class HebrewEnglishSwitcher:
     LANG_ENGLISH = 0x0409
     LANG_HEBREW = 0x040D
     
-    def __init__(self, debug=False):
-        self.is_running = True
-        self.is_fixing = False
-        self.last_switch_time = 0
+    # Ceilings (seconds) for the completion waits in the fix path - see wait_for()
+    WAIT_POLL = 0.005
+    HOTKEY_RELEASE_TIMEOUT = 0.3
+    INPUT_IDLE_TIMEOUT = 0.1
+    LAYOUT_TIMEOUT = 0.2
+    
+    def __init__(self, debug=False, backend=None):
+        self.stop_event = threading.Event()  # Set by stop() - run() and the autosave thread wait on it
+        self.wakeups = Counter()  # Timer wake-ups of the switcher's own threads
+        self.last_switch_time = float('-inf')
+        self.last_switch_layout = None
         self.debug = debug
-        self.pynput_controller = KeyboardController()
+        
+        # All OS access goes through the backend (FakeBackend for headless use)
+        self.backend = backend if backend is not None else WindowsBackend()
         
         # Language tracking - start with English (login language)
         self.tracked_language = 'english'
         
         # Current word being typed (physical keys)
         self.current_word_keys = ""
+        self.word_cursor = WordCursor()
         
         # Track Alt and Shift for language switch detection
         self.alt_pressed = False
         self.shift_pressed = False
         
-        self.WM_INPUTLANGCHANGEREQUEST = 0x0050
-        
-        self.block_input = ctypes.windll.user32.BlockInput
-        self.block_input.argtypes = [ctypes.c_bool]
-        self.block_input.restype = ctypes.c_bool
-        
-        # Initialize English dictionary
+        # English dictionary is created by load_dictionaries() in the background
         self.english_dict = None
-        if ENCHANT_AVAILABLE:
-            for lang in ['en_US', 'en_GB', 'en']:
-                try:
-                    self.english_dict = enchant.Dict(lang)
-                    if self.debug:
-                        print(f"  Loaded English dictionary: {lang}")
-                    break
-                except:
-                    pass
+        self.english_cache = EnglishSpellCache(CONFIG['english_cache_size'])
+        self.hebrew_hot = HotWordTier(CONFIG['hebrew_hot_words'])
+        self.decision_cache = DecisionCache(CONFIG['decision_cache_size'])
+        self.latency = LatencyStats()
+        
+        # Output actions run one at a time on the worker thread (started by run())
+        self.fix_worker = FixWorker(self)
+        self.typed_after_fix = ''  # Screen text typed since the last queued fix (None = unknown)
+        self.typed_lock = threading.Lock()  # Hook's updates of typed_after_fix / current_word_keys vs fix_words()
+        self.abandoned_fixes = 0   # Fixes not applied because the cursor moved before they ran
+        self.dictionaries_ready = False
+        self.load_timings = {}
+        self.word_file_stamps = {}  # File name -> file_stamp() when last loaded
+        self.retired_lexicons = []  # Mapped lexicons a reload replaced - see close_retired_lexicons()
         
         # Load alignment button images (for Outlook)
         self.script_dir = get_script_dir()
+        self.user_dir = get_user_data_dir()
         self.align_left_img = os.path.join(self.script_dir, 'align_left.png')
         self.align_right_img = os.path.join(self.script_dir, 'align_right.png')
+        self.align_left_locator = ButtonLocator(self.backend, self.align_left_img)
+        self.align_right_locator = ButtonLocator(self.backend, self.align_right_img)
+        
+        # Ignore and learned word lists
+        self.ignored_words_file = WordListFile(os.path.join(self.script_dir, 'ignore_words.txt'),
+                                               parse_ignored_word, format_ignored_word,
+                                               CONFIG['word_list_compact_lines'])
+        self.learned_words_file = WordListFile(os.path.join(self.script_dir, 'learned_words.txt'),
+                                               parse_learned_word, format_learned_word,
+                                               CONFIG['word_list_compact_lines'])
         
         # Setup log file
         self.log_file = os.path.join(self.script_dir, 'switcher_log.txt')
+        self.latency_file = os.path.join(self.script_dir, 'latency_stats.txt')
         self.recent_words = []  # Buffer for last 10 words
+        self.file_logger = None
+        if self.debug:
+            self.file_logger = AsyncFileLogger(self.log_file,
+                                               max_bytes=CONFIG['log_max_kb'] * 1024,
+                                               buffer_lines=CONFIG['log_buffer_lines'])
         self.file_log("="*50)
         self.file_log(f"STARTUP - v3.1.64")
         self.file_log(f"Initial tracked_language: {self.tracked_language}")
+        self.file_log(f"Imports: {self.import_report()}")
         self.file_log("="*50)
         
         # Check if image files exist
@@ -320,18 +2614,30 @@ class HebrewEnglishSwitcher:
         
         # Force-fix tracking (for Ctrl+` on unfixed words)
         self.last_unfixed_word = None  # Store last word that wasn't auto-fixed
+        self.last_unfixed_end = ' '  # Key that ended it (space, tab or newline)
         self.last_unfixed_was_first = False  # Was it the first word of line?
         
+        # Foreground window and its lowercased title, kept current by the
+        # backend's foreground watch (see on_foreground_change) so the hook
+        # never has to ask the OS
+        self.foreground_hwnd = self.backend.foreground_window()
+        self.foreground_title = self.get_window_title(self.foreground_hwnd).lower()
+        
         # Context tracking - clear buffer on window/mouse change
-        self.last_active_window = win32gui.GetForegroundWindow()
+        self.last_active_window = self.foreground_hwnd
+        
+        # Event recording (--record) - see KeyEventRecorder
+        self.recorder = None
+        # Startup profiling (--profile-startup) - see StartupProfile
+        self.startup_profile = None
         
         if self.debug:
             print("="*60)
             print("  Hebrew-English Auto Switcher v3.1.64")
             print("="*60)
-            print(f"  English: {'pyenchant dictionary' if self.english_dict else 'heuristics'}")
-            hebrew_count = len(HEBREW_DICTIONARY) if HEBREW_DICTIONARY else len(HEBREW_WORDS)
-            print(f"  Hebrew: {hebrew_count:,} words")
+            print(f"  English: {'pyenchant dictionary' if ENCHANT_AVAILABLE else 'heuristics'} (loading in background)")
+            print(f"  Hebrew: {len(HEBREW_WORDS) + len(SHORT_HEBREW_WORDS):,} built-in words until full dictionary loads")
+            print(f"  Imports: {self.import_report()}")
             print(f"  Starting language: {self.tracked_language.upper()}")
             print(f"  Auto-direction: Enabled (first word only)")
             print("  ")
@@ -342,6 +2648,7 @@ class HebrewEnglishSwitcher:
             print("    Ctrl+Alt+H   - Force Hebrew")
             print("    Ctrl+Alt+A   - About")
             print("    Ctrl+Alt+R   - Release stuck keys (Caps Lock / Ctrl / Shift)")
+            print("    Ctrl+Alt+L   - Latency stats (also saved to latency_stats.txt)")
             print("    Ctrl+Alt+Q   - Quit")
             print("="*60 + "\n")
     
@@ -349,27 +2656,293 @@ class HebrewEnglishSwitcher:
         if self.debug:
             print(msg)
     
-    def file_log(self, msg):
-        """Write to log file with timestamp (only in debug mode)"""
-        if not self.debug:
-            return
-        from datetime import datetime
+    def start_action(self, target, *args):
+        """Queue an output action (fix, undo, direction change) for the fix worker"""
+        self.fix_worker.submit(target, *args)
+    
+    def submit_fix(self, corrected, target_lang, original_keys, is_first_word, end):
+        """Queue a fix for the word that was just ended by `end` (space, tab or newline)"""
+        screen_word = self.get_screen_word(original_keys)
+        
+        # What was typed between the previous queued fix and this word - needed
+        # to merge the two into one batch
+        gap = ''
+        if self.fix_worker.outstanding:
+            typed = self.typed_after_fix
+            gap = typed[:len(typed) - len(screen_word)] if typed is not None and typed.endswith(screen_word) else None
+        self.typed_after_fix = ''
+        
+        self.start_action(self.fix_words, [{
+            'screen': screen_word,
+            'corrected': corrected,
+            'target_lang': target_lang,
+            'is_first': is_first_word,
+            'end': end,
+            'gap': gap,
+        }])
+    
+    def track_typed(self, text):
+        """Keep typed_after_fix in step with the screen while fixes are queued.
+        text=None means the cursor moved or the text can't be known."""
+        if not self.fix_worker.outstanding:
+            self.typed_after_fix = ''
+        elif text is None or self.typed_after_fix is None:
+            self.typed_after_fix = None
+        else:
+            self.typed_after_fix += text
+    
+    def text_after_fixes(self):
+        """Screen text after the oldest queued word: the later queued words and
+        what was typed since. None if the cursor moved in between.
+        Call with typed_lock held."""
+        text = ''
+        for job in self.fix_worker.queued_fixes():
+            if job['gap'] is None:
+                return None
+            text += job['gap'] + job['screen'] + job['end']
+        if self.typed_after_fix is None:
+            return None
+        return text + self.typed_after_fix
+    
+    def typed_char(self, key_char):
+        """Character a physical key puts on screen in the tracked language, or
+        None when Shift / Caps Lock make it uncertain"""
+        upper = self.shift_pressed != self.backend.is_caps_lock_on()
+        if self.ctrl_pressed:
+            return None
+        if self.tracked_language == 'hebrew':
+            return None if upper else self.keys_to_hebrew(key_char)
+        if upper:
+            return key_char.upper() if key_char.isalpha() else None
+        return key_char
+    
+    def import_report(self):
+        """Startup import time per module against IMPORT_BUDGET_MS"""
+        total_ms = startup_import_ms()
+        modules = ', '.join(f"{name} {sec * 1000:.0f} ms" for name, sec in IMPORT_TIMES.items())
+        status = 'OVER BUDGET' if total_ms > IMPORT_BUDGET_MS else 'within budget'
+        return f"{total_ms:.0f} ms ({modules or 'none'}) - {status} of {IMPORT_BUDGET_MS} ms"
+    
+    def load_english_dictionary(self):
+        """Create the enchant English dictionary and warm it up.
+        Returns None if pyenchant or an English dictionary is not available."""
+        global enchant
+        if not ENCHANT_AVAILABLE:
+            return None
         try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(f"[{timestamp}] {msg}\n")
-            
-            # Keep log file small - max 1000 lines
+            with import_timer('enchant'):
+                import enchant
+        except Exception as e:
+            print(f"  Error importing enchant: {e}")
+            return None
+        for lang in ['en_US', 'en_GB', 'en']:
             try:
-                with open(self.log_file, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                if len(lines) > 1000:
-                    with open(self.log_file, 'w', encoding='utf-8') as f:
-                        f.writelines(lines[-500:])  # Keep last 500 lines
+                english_dict = enchant.Dict(lang)
+                english_dict.check('the')  # First check loads the backend's word data
+                self.log(f"  Loaded English dictionary: {lang}")
+                return english_dict
             except:
                 pass
+        return None
+    
+    def english_cache_tag(self):
+        """Identifies the enchant dictionary the cached results came from"""
+        try:
+            provider = self.english_dict.provider.name
         except:
-            pass
+            provider = 'unknown'
+        try:
+            version = enchant.get_enchant_version()
+        except:
+            version = getattr(enchant, '__version__', 'unknown')
+        return f"{provider}|{self.english_dict.tag}|{version}"
+    
+    def save_english_cache(self):
+        if self.english_dict:
+            self.english_cache.save(os.path.join(self.user_dir, 'english_cache.txt'))
+        if self.dictionaries_ready:
+            self.hebrew_hot.save(os.path.join(self.user_dir, 'hebrew_hot_words.txt'))
+    
+    def autosave_english_cache(self):
+        """Save the English cache and Hebrew hot words every few minutes (if they changed)"""
+        while not self.stop_event.wait(300):
+            self.wakeups['autosave'] += 1
+            self.save_english_cache()
+    
+    def load_dictionaries(self):
+        """Staged dictionary load, run in the background after the hook is live.
+        Until it finishes, is_valid_hebrew_keys() answers from the built-in lists and
+        is_valid_english() only accepts COMMON_SHORT_ENGLISH."""
+        global HEBREW_DICTIONARY, HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX
+        timings = {}
+        try:
+            # Stage 1: ignore + learned lists (undo/force-fix may already have
+            # added entries - those are in the files by now)
+            start = time.perf_counter()
+            self.load_word_lists()
+            timings['word_lists'] = time.perf_counter() - start
+            
+            # Stage 2: physical-key indexes (optional, built with --build-index)
+            start = time.perf_counter()
+            HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX = load_key_indexes()
+            timings['key_indexes'] = time.perf_counter() - start
+            
+            # Stage 2b: full Hebrew dictionary - only without hebrew_keys.bin,
+            # which answers every Hebrew lookup when it is there
+            start = time.perf_counter()
+            if HEBREW_KEY_INDEX is None:
+                HEBREW_DICTIONARY = load_hebrew_dictionary()
+            timings['hebrew_dictionary'] = time.perf_counter() - start
+            
+            # Stage 2c: hot tier - the words this user typed most in earlier runs
+            start = time.perf_counter()
+            self.hebrew_hot = HotWordTier.load(os.path.join(self.user_dir, 'hebrew_hot_words.txt'),
+                                               CONFIG['hebrew_hot_words'], self.in_hebrew_dictionary)
+            timings['hebrew_hot_words'] = time.perf_counter() - start
+            
+            # Stage 3: English checker
+            start = time.perf_counter()
+            self.english_dict = self.load_english_dictionary()
+            if self.english_dict:
+                self.english_cache = EnglishSpellCache.load(
+                    os.path.join(self.user_dir, 'english_cache.txt'),
+                    self.english_cache_tag(), CONFIG['english_cache_size'])
+            timings['english_dictionary'] = time.perf_counter() - start
+            
+            # Stage 4: move everything loaded so far out of GC tracking, so later
+            # collections don't rescan hundreds of thousands of strings
+            start = time.perf_counter()
+            if hasattr(gc, 'freeze'):
+                gc.collect()
+                gc.freeze()
+            timings['gc_freeze'] = time.perf_counter() - start
+        except Exception as e:
+            print(f"  Error loading dictionaries: {e}")
+            self.file_log(f"LOAD: error {e}")
+        finally:
+            self.load_timings = timings
+            self.word_file_stamps = self.current_word_file_stamps()
+            self.dictionaries_ready = True
+            # Decisions made from the built-in lists are now out of date
+            self.decision_cache.invalidate_all()
+            if self.startup_profile:
+                self.startup_profile.dictionaries_loaded(timings, {
+                    'word_lists': len(IGNORED_WORDS) + len(LEARNED_WORDS),
+                    'hebrew_dictionary': len(HEBREW_DICTIONARY),
+                    'key_indexes': len(HEBREW_KEY_INDEX or ()) + len(ENGLISH_KEY_INDEX or ()),
+                    'hebrew_hot_words': len(self.hebrew_hot),
+                    'english_dictionary': len(self.english_cache),
+                })
+        
+        summary = ', '.join(f"{stage} {sec * 1000:.1f} ms" for stage, sec in timings.items())
+        print(f"  Dictionaries ready ({summary})")
+        self.file_log(f"LOAD: {summary}")
+    
+    # Files reload_word_files() watches, by the structure they feed
+    WORD_FILES = {
+        'ignore_words.txt': 'ignored',
+        'learned_words.txt': 'learned',
+        'hebrew_words.txt': 'hebrew',
+        'hebrew_words.bin': 'hebrew',
+        'hebrew_keys.bin': 'hebrew',
+        'english_keys.bin': 'hebrew',
+    }
+    RELOAD_SETTLE = 0.5  # Seconds a changed file must stay unchanged before it is read
+    
+    def load_word_lists(self, ignored=True, learned=True):
+        """(Re)load ignore_words.txt and/or learned_words.txt into the globals"""
+        global IGNORED_WORDS, LEARNED_WORDS
+        with WORD_LISTS_LOCK:
+            if ignored:
+                try:
+                    IGNORED_WORDS = self.ignored_words_file.load()
+                    self.note_word_file_write(self.ignored_words_file)
+                    print(f"  Loaded {len(IGNORED_WORDS)} ignored words")
+                except Exception as e:
+                    print(f"  Error loading ignore_words.txt: {e}")
+            if learned:
+                try:
+                    LEARNED_WORDS = self.learned_words_file.load()
+                    self.note_word_file_write(self.learned_words_file)
+                    print(f"  Loaded {len(LEARNED_WORDS)} learned words")
+                except Exception as e:
+                    print(f"  Error loading learned_words.txt: {e}")
+    
+    def note_word_file_write(self, word_file):
+        """Record our own write (append or compaction) so the file watcher
+        doesn't reload it"""
+        if self.word_file_stamps:
+            self.word_file_stamps[os.path.basename(word_file.path)] = file_stamp(word_file.path)
+    
+    def current_word_file_stamps(self):
+        return {name: file_stamp(os.path.join(self.script_dir, name)) for name in self.WORD_FILES}
+    
+    def watch_word_files(self):
+        """Reload word files when they change on disk (thread target)"""
+        self.backend.watch_directory(self.script_dir, self.on_word_files_changed)
+    
+    def on_word_files_changed(self):
+        """Directory change notification: reload whatever word files changed,
+        once they have stopped changing"""
+        if not self.dictionaries_ready:
+            return  # The initial load picks them up
+        stamps = self.current_word_file_stamps()
+        if stamps == self.word_file_stamps:
+            return
+        # Wait for the copy to finish
+        while not self.stop_event.wait(self.RELOAD_SETTLE):
+            settled = self.current_word_file_stamps()
+            if settled == stamps:
+                break
+            stamps = settled
+        changed = {self.WORD_FILES[name] for name in stamps if stamps[name] != self.word_file_stamps.get(name)}
+        self.word_file_stamps = stamps
+        self.reload_word_files(changed)
+    
+    def reload_word_files(self, kinds):
+        """
+        Rebuild the structures fed by changed files ('ignored', 'learned',
+        'hebrew') in the background and swap them in. The hook keeps using the
+        old objects until the new ones are complete.
+        """
+        global HEBREW_DICTIONARY, HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX
+        start = time.perf_counter()
+        counts = []
+        try:
+            if 'ignored' in kinds or 'learned' in kinds:
+                self.load_word_lists('ignored' in kinds, 'learned' in kinds)
+            if 'ignored' in kinds:
+                counts.append(f"{len(IGNORED_WORDS):,} ignored")
+            if 'learned' in kinds:
+                counts.append(f"{len(LEARNED_WORDS):,} learned")
+            if 'hebrew' in kinds:
+                hebrew_index, english_index = load_key_indexes()
+                dictionary = load_hebrew_dictionary() if hebrew_index is None else set()
+                replaced = self.lexicons().values()
+                HEBREW_DICTIONARY, HEBREW_KEY_INDEX, ENGLISH_KEY_INDEX = dictionary, hebrew_index, english_index
+                self.retired_lexicons.extend(lexicon for lexicon in replaced
+                                             if isinstance(lexicon, CompiledWordList))
+                self.hebrew_hot.retain(self.in_hebrew_dictionary)
+                counts.append(f"{len(HEBREW_KEY_INDEX or HEBREW_DICTIONARY):,} Hebrew words")
+        except Exception as e:
+            print(f"  Error reloading word files: {e}")
+            self.file_log(f"RELOAD: error {e}")
+            return
+        finally:
+            # Decisions made from the old lists are out of date
+            self.decision_cache.invalidate_all()
+        
+        # A reload can compile hebrew_words.bin or compact a word list - not
+        # changes to reload again
+        self.word_file_stamps = self.current_word_file_stamps()
+        summary = f"{', '.join(counts)} in {(time.perf_counter() - start) * 1000:.1f} ms"
+        print(f"  Word files reloaded ({summary})")
+        self.file_log(f"RELOAD: {summary}")
+    
+    def file_log(self, msg):
+        """Queue a timestamped line for the log file (only in debug mode)"""
+        if self.file_logger is not None:
+            self.file_logger.write(msg)
     
     def log_word(self, keys, screen_word, action):
         """Log a word to recent words buffer and file"""
@@ -387,7 +2960,7 @@ class HebrewEnglishSwitcher:
     
     def keys_to_hebrew(self, english_keys):
         """Convert English keys to Hebrew characters"""
-        return ''.join(self.ENGLISH_KEY_TO_HEBREW_CHAR.get(c, c) for c in english_keys.lower())
+        return keys_to_hebrew(english_keys)
     
     def get_screen_word(self, keys):
         """Get what appears on screen based on tracked language"""
@@ -411,9 +2984,30 @@ class HebrewEnglishSwitcher:
         if not word.isalpha():
             return False
         
+        # Still loading - only trust the built-in list
+        if not self.dictionaries_ready:
+            return word_lower in COMMON_SHORT_ENGLISH
+        
+        # English words are already spelled in physical keys - read the
+        # cursor state for the word being typed, otherwise one probe
+        if ENGLISH_KEY_INDEX:
+            found = self.word_cursor.lookup(word_lower, 'english')
+            if found is None:
+                found = word_lower in ENGLISH_KEY_INDEX
+            if found:
+                return True
+            if not self.english_dict:
+                # The bundled list is the whole answer without enchant
+                return False
+        
         if self.english_dict:
+            cached = self.english_cache.get(word_lower)
+            if cached is not None:
+                return cached
             try:
-                return self.english_dict.check(word_lower)
+                result = self.english_dict.check(word_lower)
+                self.english_cache.put(word_lower, result)
+                return result
             except:
                 pass
         
@@ -422,13 +3016,30 @@ class HebrewEnglishSwitcher:
         ratio = vowels / len(word_lower) if word_lower else 0
         return 0.15 <= ratio <= 0.6
     
-    def is_valid_hebrew(self, text):
-        """Check if text is a valid Hebrew word using the full dictionary"""
-        # First check the large dictionary
-        if HEBREW_DICTIONARY and text in HEBREW_DICTIONARY:
+    def is_valid_hebrew_keys(self, keys):
+        """Check if physical keys type a valid Hebrew word.
+        Checks the hot tier (words this user types most) first, then the
+        full dictionary."""
+        canonical = canonical_hebrew_keys(keys)
+        if canonical in self.hebrew_hot:
+            return True
+        found = self.in_hebrew_dictionary(canonical, keys)
+        self.hebrew_hot.record(canonical, found)
+        return found
+    
+    def in_hebrew_dictionary(self, canonical, keys=None):
+        """Cold tier: probes the key index directly (through the word cursor
+        when keys is the tracked buffer); without one, transliterates and
+        checks the Hebrew dictionary."""
+        if HEBREW_KEY_INDEX:
+            found = self.word_cursor.lookup(keys, 'hebrew') if keys else None
+            if found is None:
+                found = canonical in HEBREW_KEY_INDEX
+            if found:
+                return True
+        elif HEBREW_DICTIONARY and self.keys_to_hebrew(canonical) in HEBREW_DICTIONARY:
             return True
-        # Fallback to built-in lists if dictionary not loaded
-        return text in HEBREW_WORDS or text in SHORT_HEBREW_WORDS
+        return canonical in HEBREW_WORDS_KEYS or canonical in SHORT_HEBREW_WORDS_KEYS
     
     def detect_language(self, keys):
         """
@@ -446,17 +3057,14 @@ class HebrewEnglishSwitcher:
         if len(keys) < 2:
             return None
         
-        hebrew_version = self.keys_to_hebrew(keys)
-        english_version = keys.lower()
-        
         if self.tracked_language == 'hebrew':
             # User is typing in Hebrew, check if it's valid Hebrew
-            if self.is_valid_hebrew(hebrew_version):
+            if self.is_valid_hebrew_keys(keys):
                 return 'hebrew'
             return None
         else:
             # User is typing in English, check if it's valid English
-            if self.is_valid_english(english_version):
+            if self.is_valid_english(keys.lower()):
                 return 'english'
             return None
     
@@ -484,6 +3092,34 @@ class HebrewEnglishSwitcher:
             self.log(f"  Skipping (contains numbers): '{keys}'")
             return None, None
         
+        # Same word typed again - reuse the decision unless an ignore/learned
+        # change or a dictionary reload has made it stale
+        cached = self.decision_cache.get(keys, self.tracked_language)
+        if cached is not None:
+            corrected, target_lang, action = cached
+            self.log(f"  Keys: '{keys}' | Tracked: {self.tracked_language.upper()} -> cached: {action}")
+            if target_lang == 'hebrew' or action == "no_fix (valid hebrew)":
+                # Still a use of the Hebrew word - keeps the hot tier's counts right
+                self.hebrew_hot.repeat(canonical_hebrew_keys(keys))
+        else:
+            generation = self.decision_cache.generation
+            corrected, target_lang, action = self.decide_word(keys, punctuation)
+            if self.dictionaries_ready:
+                # Decisions made while loading come from partial lists - don't keep them
+                self.decision_cache.put(keys, self.tracked_language, generation, (corrected, target_lang, action))
+        
+        if action:
+            self.log_word(keys, self.get_screen_word(keys), action)
+        if corrected is None:
+            return None, None
+        return corrected + punctuation, target_lang
+    
+    def decide_word(self, keys, punctuation=''):
+        """
+        Decision rules for a word without trailing punctuation.
+        Returns: (corrected_word, target_language, action) - action is the
+        description logged with log_word(), or None if nothing is logged.
+        """
         # Check learned words first (user force-fixed these before)
         keys_lower = keys.lower()
         if keys_lower in LEARNED_WORDS:
@@ -493,53 +3129,47 @@ class HebrewEnglishSwitcher:
             else:
                 corrected = keys_lower
             self.log(f"  -> Learned word! Fixing to {target_lang}: '{corrected}'")
-            self.log_word(keys, self.get_screen_word(keys), f"FIX (learned) to {target_lang}: {corrected}")
-            return corrected + punctuation, target_lang
+            return corrected, target_lang, f"FIX (learned) to {target_lang}: {corrected}"
         
-        # Get what's on screen based on tracked language
-        screen_word = self.get_screen_word(keys)
+        # Get what's on screen based on tracked language (transliterate once)
         hebrew_version = self.keys_to_hebrew(keys)
         english_version = keys.lower()
+        screen_word = hebrew_version if self.tracked_language == 'hebrew' else keys
         
         self.log(f"  Keys: '{keys}' | Screen: '{screen_word}' | Tracked: {self.tracked_language.upper()}" + (f" | Punct: '{punctuation}'" if punctuation else ""))
         
         # Skip if in ignored words
-        if screen_word in IGNORED_WORDS or screen_word.lower() in IGNORED_WORDS:
+        if screen_word.lower() in IGNORED_WORDS:
             self.log(f"  -> Skipping (ignored word): '{screen_word}'")
-            return None, None
-        if keys in IGNORED_WORDS or keys.lower() in IGNORED_WORDS:
+            return None, None, None
+        if keys_lower in IGNORED_WORDS:
             self.log(f"  -> Skipping (ignored word): '{keys}'")
-            return None, None
+            return None, None, None
         
         if self.tracked_language == 'hebrew':
             # Screen shows Hebrew - check if it should be English
             
             # Check if it's valid Hebrew
-            if self.is_valid_hebrew(hebrew_version):
+            if self.is_valid_hebrew_keys(keys):
                 self.log(f"  -> Valid Hebrew '{hebrew_version}', no fix")
-                self.log_word(keys, screen_word, "no_fix (valid hebrew)")
-                return None, None
+                return None, None, "no_fix (valid hebrew)"
             
             # For short words, only fix if it's a common English word
             if len(keys) <= 3:
                 if english_version in COMMON_SHORT_ENGLISH:
                     self.log(f"  -> '{english_version}' is common short English - FIXING!")
-                    self.log_word(keys, screen_word, f"FIX to english: {english_version}")
-                    return english_version + punctuation, 'english'
+                    return english_version, 'english', f"FIX to english: {english_version}"
                 else:
                     self.log(f"  -> Short word, not in common list, skipping")
-                    self.log_word(keys, screen_word, "no_fix (short, not common)")
-                    return None, None
+                    return None, None, "no_fix (short, not common)"
             
             # Check if the keys form a valid English word
             if self.is_valid_english(english_version):
                 self.log(f"  -> '{english_version}' is valid English - FIXING!")
-                self.log_word(keys, screen_word, f"FIX to english: {english_version}")
-                return english_version + punctuation, 'english'
+                return english_version, 'english', f"FIX to english: {english_version}"
             
             self.log(f"  -> Not recognized")
-            self.log_word(keys, screen_word, "no_fix (not recognized)")
-            return None, None
+            return None, None, "no_fix (not recognized)"
         
         else:
             # Screen shows English - check if it should be Hebrew
@@ -547,54 +3177,89 @@ class HebrewEnglishSwitcher:
             # Check if it's valid English
             if self.is_valid_english(english_version):
                 self.log(f"  -> Valid English '{english_version}', no fix")
-                self.log_word(keys, screen_word, "no_fix (valid english)")
-                return None, None
+                return None, None, "no_fix (valid english)"
+            
+            # Until the English checker is loaded only COMMON_SHORT_ENGLISH is
+            # known, so ordinary English ('drug', 'cut') would look like Hebrew
+            if not self.dictionaries_ready:
+                self.log(f"  -> Dictionaries still loading, no fix")
+                return None, None, "no_fix (loading)"
             
             # Skip if Hebrew version is in ignored words
             if hebrew_version in IGNORED_WORDS:
                 self.log(f"  -> Skipping (ignored word): '{hebrew_version}'")
-                self.log_word(keys, screen_word, "no_fix (ignored)")
-                return None, None
+                return None, None, "no_fix (ignored)"
             
             # For short words, only fix if it's a common Hebrew word
             if len(keys) <= 3:
-                if hebrew_version in SHORT_HEBREW_WORDS or hebrew_version in HEBREW_WORDS:
+                canonical = canonical_hebrew_keys(keys)
+                if canonical in SHORT_HEBREW_WORDS_KEYS or canonical in HEBREW_WORDS_KEYS:
                     self.log(f"  -> '{hebrew_version}' is common short Hebrew - FIXING!")
-                    self.log_word(keys, screen_word, f"FIX to hebrew: {hebrew_version}")
-                    return hebrew_version + punctuation, 'hebrew'
+                    return hebrew_version, 'hebrew', f"FIX to hebrew: {hebrew_version}"
                 else:
                     self.log(f"  -> Short word, not in common list, skipping")
-                    self.log_word(keys, screen_word, "no_fix (short, not common)")
-                    return None, None
+                    return None, None, "no_fix (short, not common)"
             
             # Check if it would be valid Hebrew
-            if self.is_valid_hebrew(hebrew_version):
+            if self.is_valid_hebrew_keys(keys):
                 self.log(f"  -> '{hebrew_version}' is valid Hebrew - FIXING!")
-                self.log_word(keys, screen_word, f"FIX to hebrew: {hebrew_version}")
-                return hebrew_version + punctuation, 'hebrew'
+                return hebrew_version, 'hebrew', f"FIX to hebrew: {hebrew_version}"
             
             self.log(f"  -> Not recognized")
-            self.log_word(keys, screen_word, "no_fix (not recognized)")
-            return None, None
+            return None, None, "no_fix (not recognized)"
     
-    def get_active_window_title(self):
-        """Get the title of the active window"""
+    def classify_batch(self, words, tracked_language='english'):
+        """
+        Run the analyze_and_fix() rules over many physical-key strings without
+        touching the keyboard (use a switcher that isn't running the hook).
+        words: iterable of key strings, all assumed typed in tracked_language
+        Yields: (keys, screen_word, corrected_word, target_language) -
+        corrected_word/target_language are None when no fix would be made.
+        Repeated words are answered from the decision cache.
+        """
+        saved_language = self.tracked_language
+        self.tracked_language = tracked_language
+        try:
+            for keys in words:
+                corrected, target_lang = self.analyze_and_fix(keys)
+                yield keys, self.get_screen_word(keys), corrected, target_lang
+        finally:
+            self.tracked_language = saved_language
+    
+    def get_window_title(self, hwnd):
+        """Get the title of a window"""
         try:
-            hwnd = win32gui.GetForegroundWindow()
-            return win32gui.GetWindowText(hwnd)
+            return self.backend.window_title(hwnd)
         except:
             return ""
     
+    def get_active_window_title(self):
+        """Lowercased title of the active window (cached, see on_foreground_change)"""
+        return self.foreground_title
+    
+    def on_foreground_change(self, hwnd, title):
+        """The foreground window, or its title, changed"""
+        self.foreground_hwnd = hwnd
+        self.foreground_title = title.lower()
+    
+    def refresh_foreground(self):
+        """Ask the OS for the foreground window if the backend's foreground
+        watch isn't running (its hooks failed) - otherwise the cached
+        foreground_hwnd / foreground_title are current"""
+        if not self.backend.foreground_watched:
+            hwnd = self.backend.foreground_window()
+            self.on_foreground_change(hwnd, self.get_window_title(hwnd))
+    
     def is_outlook(self):
         """Check if Outlook is the active window"""
-        title = self.get_active_window_title().lower()
+        title = self.get_active_window_title()
         # Check for various Outlook window titles
         outlook_indicators = ['outlook', 'new mail', 'new message', 'message (html)', 'message (rich text)', 'message (plain text)']
         return any(indicator in title for indicator in outlook_indicators)
     
     def is_word(self):
         """Check if Word is the active window"""
-        title = self.get_active_window_title().lower()
+        title = self.get_active_window_title()
         return 'word' in title or '.docx' in title or '.doc' in title
     
     def align_left_outlook(self):
@@ -606,24 +3271,14 @@ class HebrewEnglishSwitcher:
                 self.log(f"  ERROR: Image file not found!")
                 return False
             
-            # Try multiple confidence levels
-            location = None
-            for confidence in [0.9, 0.8, 0.7, 0.6, 0.5]:
-                try:
-                    location = pyautogui.locateOnScreen(self.align_left_img, confidence=confidence, grayscale=True)
-                    if location:
-                        self.log(f"  Found at confidence {confidence}")
-                        break
-                except TypeError:
-                    # OpenCV not installed
-                    location = pyautogui.locateOnScreen(self.align_left_img)
-                    break
-                except Exception:
-                    continue
+            # One capture + one correlation pass, thresholds 0.9-0.5 applied to the result
+            box, confidence = self.align_left_locator.locate(self.foreground_hwnd)
             
-            if location:
-                center = pyautogui.center(location)
-                pyautogui.click(center)
+            if box:
+                self.log(f"  Found at confidence {confidence}")
+                left, top, width, height = box
+                center = (left + width // 2, top + height // 2)
+                self.backend.click_point(*center)
                 self.log(f"  Clicked Align Left at {center}")
                 return True
             else:
@@ -642,24 +3297,14 @@ class HebrewEnglishSwitcher:
                 self.log(f"  ERROR: Image file not found!")
                 return False
             
-            # Try multiple confidence levels
-            location = None
-            for confidence in [0.9, 0.8, 0.7, 0.6, 0.5]:
-                try:
-                    location = pyautogui.locateOnScreen(self.align_right_img, confidence=confidence, grayscale=True)
-                    if location:
-                        self.log(f"  Found at confidence {confidence}")
-                        break
-                except TypeError:
-                    # OpenCV not installed
-                    location = pyautogui.locateOnScreen(self.align_right_img)
-                    break
-                except Exception:
-                    continue
+            # One capture + one correlation pass, thresholds 0.9-0.5 applied to the result
+            box, confidence = self.align_right_locator.locate(self.foreground_hwnd)
             
-            if location:
-                center = pyautogui.center(location)
-                pyautogui.click(center)
+            if box:
+                self.log(f"  Found at confidence {confidence}")
+                left, top, width, height = box
+                center = (left + width // 2, top + height // 2)
+                self.backend.click_point(*center)
                 self.log(f"  Clicked Align Right at {center}")
                 return True
             else:
@@ -678,31 +3323,31 @@ class HebrewEnglishSwitcher:
 
         ctrl_sent = False
         shift_key = None
+        start = time.perf_counter()
         try:
             # Send a space then backspace to "wake up" the editor (helps Outlook)
             # Only needed when no typing happened before this call
             if wake_editor:
-                keyboard.send('space')
-                time.sleep(0.02)
-                keyboard.send('backspace')
-                time.sleep(0.02)
+                self.backend.send_key('space')
+                self.backend.send_key('backspace')
+                self.wait_input_idle()
 
             if language == 'english':
                 # Ctrl+Left Shift = LTR (English)
-                keyboard.press('ctrl')
+                self.backend.press_key('ctrl')
                 ctrl_sent = True
                 shift_key = 'left shift'
-                keyboard.press(shift_key)
-                keyboard.release(shift_key)
+                self.backend.press_key(shift_key)
+                self.backend.release_key(shift_key)
                 shift_key = None
                 self.log("  [DIRECTION] Sent Ctrl+Left Shift (LTR)")
             else:
                 # Ctrl+Right Shift = RTL (Hebrew)
-                keyboard.press('ctrl')
+                self.backend.press_key('ctrl')
                 ctrl_sent = True
                 shift_key = 'right shift'
-                keyboard.press(shift_key)
-                keyboard.release(shift_key)
+                self.backend.press_key(shift_key)
+                self.backend.release_key(shift_key)
                 shift_key = None
                 self.log("  [DIRECTION] Sent Ctrl+Right Shift (RTL)")
             self.direction_set_for_line = True
@@ -711,87 +3356,154 @@ class HebrewEnglishSwitcher:
         finally:
             if shift_key:
                 try:
-                    keyboard.release(shift_key)
+                    self.backend.release_key(shift_key)
                 except:
                     pass
             if ctrl_sent:
                 try:
-                    keyboard.release('ctrl')
+                    self.backend.release_key('ctrl')
                 except:
                     pass
+            self.latency.record('alignment', time.perf_counter() - start)
+    
+    def set_first_word_direction(self, language):
+        """Set direction for a first word that didn't need fixing"""
+        self.wait_input_idle()
+        self.set_alignment(language, wake_editor=True)
+        self.direction_set_for_line = True
+    
+    def wait_for(self, name, condition, timeout):
+        """
+        Poll condition() until it returns True or timeout seconds pass.
+        The time spent is recorded as the 'wait_<name>' latency stage and a
+        timeout is counted in latency.timeouts. Returns the last result.
+        """
+        start = self.backend.now()
+        done = condition()
+        while not done and self.backend.now() - start < timeout:
+            self.backend.sleep(self.WAIT_POLL)
+            done = condition()
+        self.latency.record(f'wait_{name}', self.backend.now() - start)
+        if not done:
+            self.latency.timeouts[name] += 1
+            self.log(f"  [WAIT] {name} timed out after {timeout * 1000:.0f} ms")
+        return done
+    
+    def wait_input_idle(self, timeout=None):
+        """Wait until the foreground app has (probably) taken the input sent so
+        far - see WindowsBackend.input_idle() for what the check can miss"""
+        hwnd = self.foreground_hwnd
+        return self.wait_for('input_idle', lambda: self.backend.input_idle(hwnd),
+                             self.INPUT_IDLE_TIMEOUT if timeout is None else timeout)
+    
+    def wait_hotkey_release(self):
+        """Wait until the user lets go of Ctrl+`, then make sure Ctrl is up"""
+        self.wait_for('hotkey_release', lambda: not self.backend.keys_down(['ctrl', '`']),
+                      self.HOTKEY_RELEASE_TIMEOUT)
+        self.backend.release_key('left ctrl')
+        self.backend.release_key('right ctrl')
+        self.wait_input_idle()
+    
+    def wait_layout(self, to_hebrew, timeout=None):
+        """Wait until the foreground window reports the requested layout"""
+        target = self.LANG_HEBREW if to_hebrew else self.LANG_ENGLISH
+        hwnd = self.foreground_hwnd
+        return self.wait_for('layout', lambda: self.backend.window_layout(hwnd) == target,
+                             self.LAYOUT_TIMEOUT if timeout is None else timeout)
     
     def switch_keyboard(self, to_hebrew):
         """Switch the keyboard layout"""
-        now = time.time()
-        if now - self.last_switch_time < 0.3:
-            return
+        now = self.backend.now()
         target = self.LANG_HEBREW if to_hebrew else self.LANG_ENGLISH
-        hwnd = win32gui.GetForegroundWindow()
-        win32api.PostMessage(hwnd, self.WM_INPUTLANGCHANGEREQUEST, 0, target)
+        # Only repeat requests are rate-limited - with queued fixes a switch back
+        # can legitimately follow within 0.3 s
+        if target == self.last_switch_layout and now - self.last_switch_time < 0.3:
+            return
+        with self.latency.time('switch_keyboard'):
+            self.backend.request_layout(self.foreground_hwnd, target)
         self.last_switch_time = now
+        self.last_switch_layout = target
     
-    def fix_word(self, corrected, target_lang, original_keys, is_first_word=False):
-        """Erase the wrong word and type the correct one"""
-        if self.is_fixing:
-            return
+    def fix_words(self, jobs):
+        """
+        Erase one or more queued wrong words and type the corrections (see
+        submit_fix). Text typed after them while they waited is erased and
+        typed again unchanged, so the whole replacement is one batch.
+        """
+        first, last = jobs[0], jobs[-1]
+        
+        # Capitalize first letter if first word of line and English
+        for job in jobs:
+            if job['is_first'] and job['target_lang'] == 'english' and job['corrected']:
+                job['corrected'] = job['corrected'][0].upper() + job['corrected'][1:]
         
         # Safety check: if correction equals what's on screen, skip
-        screen_word = self.get_screen_word(original_keys)
-        if corrected == screen_word:
-            self.log(f"  -> Skip fix (already correct): '{corrected}'")
-            self.current_word_keys = ""
+        if all(job['corrected'] == job['screen'] for job in jobs):
+            self.log(f"  -> Skip fix (already correct): '{last['corrected']}'")
             return
         
-        # Capitalize first letter if first word of line and English
-        if is_first_word and target_lang == 'english' and len(corrected) > 0:
-            corrected = corrected[0].upper() + corrected[1:]
-        
-        self.is_fixing = True
         original_lang = self.tracked_language
+        target_lang = last['target_lang']
+        start = time.perf_counter()
         
         try:
             try:
-                self.block_input(True)
+                self.backend.block_input(True)
             except:
                 pass
             
-            # Step 1: Delete the word + space using backspace
-            delete_count = len(screen_word) + 1  # +1 for the space
-            for _ in range(delete_count):
-                keyboard.send('backspace')
-            time.sleep(0.05)
+            # Everything from the first word to the cursor. Input is blocked so it
+            # can't grow - but BlockInput can fail, so the hook may still be
+            # typing: read it all in one go under typed_lock
+            with self.typed_lock:
+                after = self.text_after_fixes()
+                if after is None:
+                    self.abandoned_fixes += len(jobs)
+                    self.log(f"  -> Fix abandoned (cursor moved): '{last['screen']}'")
+                    return
+                
+                # A word started while the fix waited is on screen in the old layout,
+                # but its keys are read in target_lang from now on - retype it in
+                # target_lang like the rest of the word will be
+                partial = self.current_word_keys
+                if partial and target_lang != original_lang:
+                    typed = self.get_screen_word(partial)
+                    if after.endswith(typed):
+                        retyped = self.keys_to_hebrew(partial) if target_lang == 'hebrew' else partial
+                        after = after[:len(after) - len(typed)] + retyped
+                        if self.typed_after_fix and self.typed_after_fix.endswith(typed):
+                            self.typed_after_fix = self.typed_after_fix[:len(self.typed_after_fix) - len(typed)] + retyped
+                    else:
+                        self.current_word_keys = ""
             
-            # Step 2: Switch keyboard to target language
+            on_screen = first['screen'] + first['end']
+            replacement = first['corrected'] + first['end']
+            for job in jobs[1:]:
+                on_screen += job['gap'] + job['screen'] + job['end']
+                replacement += job['gap'] + job['corrected'] + job['end']
+            
+            # Step 1: Switch keyboard to target language (for what the user types next)
             target_is_hebrew = (target_lang == 'hebrew')
             self.switch_keyboard(to_hebrew=target_is_hebrew)
-            time.sleep(0.05)
             
-            # Step 3: Type corrected word + space
-            # Normalize Caps Lock to OFF before writing - keyboard.write() can leave it
-            # stuck when BlockInput is active and GetKeyState returns stale state
-            caps_was_on = bool(ctypes.windll.user32.GetKeyState(0x14) & 0x0001)
-            if caps_was_on:
-                keyboard.send('caps lock')
-                time.sleep(0.02)
-            for char in corrected:
-                keyboard.write(char)
-            keyboard.send('space')
-            if caps_was_on:
-                keyboard.send('caps lock')
-                time.sleep(0.02)
+            # Step 2-3: Delete the words and type the corrections (+ whatever followed
+            # them) in one SendInput batch. The text goes in as Unicode, so it doesn't
+            # wait for the layout switch and Caps Lock can't change it.
+            with self.latency.time('inject'):
+                self.backend.replace_text(len(on_screen) + len(after), replacement + after)
             
             # Step 4: Set text direction (after typing, only for first word)
             # Must unblock input for Ctrl+Shift to reach the application
-            if is_first_word:
+            if first['is_first'] and '\n' not in after:
                 try:
-                    self.block_input(False)
+                    self.backend.block_input(False)
                 except:
                     pass
-                time.sleep(0.05)
-                self.set_alignment(target_lang)
-                time.sleep(0.05)
+                self.wait_input_idle()
+                self.set_alignment(first['target_lang'])
+                self.wait_input_idle()
                 try:
-                    self.block_input(True)
+                    self.backend.block_input(True)
                 except:
                     pass
             
@@ -801,36 +3513,45 @@ class HebrewEnglishSwitcher:
             
             # Step 6: Store fix info for undo detection
             self.last_fix_info = {
-                'original_screen': screen_word,
-                'corrected': corrected,
+                'original_screen': last['screen'],
+                'corrected': last['corrected'],
+                'end': last['end'],
                 'original_lang': original_lang,
                 'target_lang': target_lang
             }
             
-            # Step 7: Block delay
+            # Step 7: Block delay - keep input blocked until the app has taken the
+            # injected text and the new layout is active, at most block_delay_ms
             block_delay_sec = CONFIG['block_delay_ms'] / 1000.0
-            time.sleep(block_delay_sec)
+            if block_delay_sec > 0:
+                with self.latency.time('block_delay'):
+                    deadline = self.backend.now() + block_delay_sec
+                    self.wait_layout(target_is_hebrew, min(self.LAYOUT_TIMEOUT, block_delay_sec))
+                    self.wait_input_idle(max(0.0, deadline - self.backend.now()))
             
         finally:
             try:
-                self.block_input(False)
+                self.backend.block_input(False)
             except:
                 pass
             
-            self.is_fixing = False
-            self.current_word_keys = ""
+            self.latency.record('fix', time.perf_counter() - start)
     
     def add_to_ignore_list(self, word):
         """Add a word to the ignore list permanently"""
-        ignore_file = os.path.join(self.script_dir, 'ignore_words.txt')
+        global IGNORED_WORDS
         try:
-            # Add to in-memory set (global variable)
-            IGNORED_WORDS.add(word.lower())
-            IGNORED_WORDS.add(word)
+            with WORD_LISTS_LOCK:
+                if not self.ignored_words_file.add(word.lower(), None):
+                    return  # Already ignored
+                self.note_word_file_write(self.ignored_words_file)
+                IGNORED_WORDS = self.ignored_words_file.entries
             
-            # Add to file
-            with open(ignore_file, 'a', encoding='utf-8') as f:
-                f.write(f"\n{word}")
+            # Expire cached decisions for the keys that type this word
+            self.decision_cache.invalidate_keys(word.lower())
+            hebrew_keys = hebrew_to_keys(word)
+            if hebrew_keys:
+                self.decision_cache.invalidate_keys(hebrew_keys)
             
             self.log(f"  [UNDO] Added '{word}' to ignore list")
         except Exception as e:
@@ -840,62 +3561,51 @@ class HebrewEnglishSwitcher:
         """Handle Ctrl+` - undo last fix"""
         if not self.last_fix_info:
             return
-        if self.is_fixing:
-            return
 
         original_word = self.last_fix_info['original_screen']
         original_lang = self.last_fix_info['original_lang']
         corrected_word = self.last_fix_info['corrected']
+        end = self.last_fix_info['end']
 
-        self.is_fixing = True
-        self.current_word_keys = ""
+        with self.typed_lock:
+            self.current_word_keys = ""
+        start = time.perf_counter()
 
         try:
             # Add the original word to ignore list
             self.add_to_ignore_list(original_word)
 
             # Wait for user to release hotkey, then release ctrl
-            time.sleep(0.3)
-            keyboard.release('left ctrl')
-            keyboard.release('right ctrl')
-            time.sleep(0.1)
-
-            # Erase the corrected word + space
-            delete_count = len(corrected_word) + 1  # +1 for the space
-            for _ in range(delete_count):
-                keyboard.send('backspace')
-            time.sleep(0.1)
+            self.wait_hotkey_release()
 
             # Switch language back to original
             self.switch_keyboard(to_hebrew=(original_lang == 'hebrew'))
             self.tracked_language = original_lang
-            time.sleep(0.1)
 
-            # Reset direction flag and set alignment (no wake_editor - typing will wake it)
+            # Reset direction flag and set alignment (paragraph-wide, so it can go
+            # before the word is replaced)
             self.direction_set_for_line = False
             self.set_alignment(original_lang, wake_editor=False)
 
-            # Type back the original word + space
-            for char in original_word:
-                keyboard.write(char)
-            keyboard.send('space')
+            # Erase the corrected word + the key that ended it (space, tab or
+            # newline) and type back the original word + that key
+            with self.latency.time('inject'):
+                self.backend.replace_text(len(corrected_word) + len(end), original_word + end)
 
             # Clear the fix info
             self.last_fix_info = None
             self.last_unfixed_word = None
             self.log(f"  [UNDO] Restored '{original_word}'")
         finally:
-            self.is_fixing = False
-            self.current_word_keys = ""
+            self.latency.record('undo', time.perf_counter() - start)
     
     def handle_force_fix(self):
         """Handle Ctrl+` on unfixed word - force fix and learn"""
         if not self.last_unfixed_word:
             return
-        if self.is_fixing:
-            return
 
         keys = self.last_unfixed_word
+        end = self.last_unfixed_end
         screen_word = self.get_screen_word(keys)
         was_first_word = self.last_unfixed_was_first
 
@@ -913,37 +3623,28 @@ class HebrewEnglishSwitcher:
         # Save to learned words
         self.save_learned_word(keys.lower(), target_lang)
 
-        self.is_fixing = True
-        self.current_word_keys = ""
+        with self.typed_lock:
+            self.current_word_keys = ""
+        start = time.perf_counter()
 
         try:
             # Wait for user to release hotkey
-            time.sleep(0.3)
-            keyboard.release('left ctrl')
-            keyboard.release('right ctrl')
-            time.sleep(0.1)
-
-            # Erase the word + space (cursor is after space, so delete word length + 1 space)
-            delete_count = len(screen_word) + 1
-            self.log(f"  [FORCE FIX] Deleting {delete_count} characters (keys len={len(keys)})")
-            for _ in range(delete_count):
-                keyboard.send('backspace')
-                time.sleep(0.02)  # Small delay between backspaces
-            time.sleep(0.1)
+            self.wait_hotkey_release()
 
             # Switch keyboard
             self.switch_keyboard(to_hebrew=(target_lang == 'hebrew'))
             self.tracked_language = target_lang
-            time.sleep(0.1)
 
-            # Type corrected word + space
-            for char in corrected:
-                keyboard.write(char)
-            keyboard.send('space')
+            # Erase the word + the key that ended it (space, tab or newline - the
+            # cursor is after it) and type corrected word + that key in one batch
+            delete_count = len(screen_word) + len(end)
+            self.log(f"  [FORCE FIX] Replacing {delete_count} characters (keys len={len(keys)})")
+            with self.latency.time('inject'):
+                self.backend.replace_text(delete_count, corrected + end)
 
             # Set text direction only if this was the first word of line
             if was_first_word:
-                time.sleep(0.05)
+                self.wait_input_idle()
                 self.set_alignment(target_lang, wake_editor=True)
                 self.direction_set_for_line = True
 
@@ -952,17 +3653,18 @@ class HebrewEnglishSwitcher:
             self.last_unfixed_was_first = False
             self.log(f"  [FORCE FIX] Done - word learned for future")
         finally:
-            self.is_fixing = False
-            self.current_word_keys = ""
+            self.latency.record('force_fix', time.perf_counter() - start)
     
     def save_learned_word(self, keys, target_lang):
         """Save a word to learned_words.txt"""
         global LEARNED_WORDS
-        learned_file = os.path.join(self.script_dir, 'learned_words.txt')
         try:
-            with open(learned_file, 'a', encoding='utf-8') as f:
-                f.write(f"{keys},{target_lang}\n")
-            LEARNED_WORDS[keys.lower()] = target_lang
+            with WORD_LISTS_LOCK:
+                if not self.learned_words_file.add(keys.lower(), target_lang):
+                    return  # Already learned
+                self.note_word_file_write(self.learned_words_file)
+                LEARNED_WORDS = self.learned_words_file.entries
+            self.decision_cache.invalidate_keys(keys)
             self.log(f"  [LEARNED] Added '{keys}' -> {target_lang}")
             self.file_log(f"LEARNED: {keys} -> {target_lang}")
         except Exception as e:
@@ -973,13 +3675,13 @@ class HebrewEnglishSwitcher:
         Hotkey: Ctrl+Alt+R  (if Ctrl is stuck, just press Alt+R)"""
         for key_name in ['left ctrl', 'right ctrl', 'left shift', 'right shift', 'left alt', 'right alt']:
             try:
-                keyboard.release(key_name)
+                self.backend.release_key(key_name)
             except:
                 pass
         # Turn off Caps Lock if it's currently on
         try:
-            if ctypes.windll.user32.GetKeyState(0x14) & 0x0001:
-                keyboard.send('caps lock')
+            if self.backend.is_caps_lock_on():
+                self.backend.send_key('caps lock')
         except:
             pass
         # Reset internal modifier state
@@ -988,6 +3690,78 @@ class HebrewEnglishSwitcher:
         self.shift_pressed = False
         self.log("  [RELEASE ALL] Modifier keys released, Caps Lock normalized")
 
+    def stop(self):
+        """Stop run() (and the threads waiting on stop_event)"""
+        self.stop_event.set()
+    
+    def wakeup_stats(self):
+        """Wake-ups of the background loops since start - all of them only wake
+        for real events (messages, key presses) or the 5-minute cache autosave"""
+        wakeups = self.backend.wakeups + self.wakeups
+        return ', '.join(f"{name} {count}" for name, count in sorted(wakeups.items())) or 'none'
+    
+    def close_retired_lexicons(self):
+        """Unmap the compiled lexicons replaced by a reload. Called by the key
+        hook - the only thread that looks words up - before it handles a key,
+        so the lookup that may have been using them has finished."""
+        while self.retired_lexicons:
+            lexicon = self.retired_lexicons.pop()
+            try:
+                lexicon.close()
+            except Exception as e:
+                self.log(f"  Error closing {os.path.basename(lexicon.path)}: {e}")
+    
+    @staticmethod
+    def lexicons():
+        return {'hebrew_dictionary': HEBREW_DICTIONARY,
+                'hebrew_key_index': HEBREW_KEY_INDEX,
+                'english_key_index': ENGLISH_KEY_INDEX}
+    
+    def bloom_stats(self):
+        """Probes per compiled lexicon and how many its bloom filter rejected"""
+        return {name: {'probes': lexicon.probes, 'bloom_rejects': lexicon.bloom_rejects}
+                for name, lexicon in self.lexicons().items() if isinstance(lexicon, CompiledWordList)}
+    
+    def memory_report(self):
+        """Lexicon memory shared with other instances (read-only file
+        mappings) versus held privately by this process"""
+        shared = {}
+        private = {}
+        for name, lexicon in self.lexicons().items():
+            if isinstance(lexicon, CompiledWordList):
+                shared[name] = lexicon.size_bytes
+            elif lexicon:
+                private[name] = sys.getsizeof(lexicon) + sum(map(sys.getsizeof, lexicon))
+        for name, words in (('ignored_words', IGNORED_WORDS), ('learned_words', LEARNED_WORDS)):
+            private[name] = sys.getsizeof(words) + sum(map(sys.getsizeof, words))
+        report = {'shared_bytes': sum(shared.values()), 'private_bytes': sum(private.values()),
+                  'shared': shared, 'private': private}
+        process = self.backend.process_memory()
+        if process:
+            report['process_private_bytes'], report['process_working_set_bytes'] = process
+        return report
+    
+    def memory_stats(self):
+        report = self.memory_report()
+        line = (f"lexicons {report['shared_bytes'] / 1e6:.1f} MB shared, "
+                f"{report['private_bytes'] / 1e6:.1f} MB private")
+        if 'process_private_bytes' in report:
+            line += (f"; process {report['process_private_bytes'] / 1e6:.1f} MB private, "
+                     f"{report['process_working_set_bytes'] / 1e6:.1f} MB working set")
+        return line
+    
+    def dump_latency(self):
+        """Print the per-stage latency histograms and write them to latency_stats.txt.
+        Hotkey: Ctrl+Alt+L"""
+        report = (self.latency.report() + f"\nwake-ups: {self.wakeup_stats()}"
+                  + f"\nhebrew lexicon: {self.hebrew_hot.stats()}"
+                  + f"\nmemory: {self.memory_stats()}")
+        print("  [Latency]\n" + '\n'.join(f"    {line}" for line in report.split('\n')))
+        try:
+            self.latency.save(self.latency_file)
+        except Exception as e:
+            print(f"  Could not write {self.latency_file}: {e}")
+    
     def toggle_language(self):
         """Toggle the tracked language"""
         old_lang = self.tracked_language
@@ -1006,160 +3780,187 @@ class HebrewEnglishSwitcher:
         self.file_log(f"LANG_SET: {old_lang} -> {self.tracked_language} (manual)")
     
     def on_key_press(self, key):
-        if self.is_fixing:
-            return
+        if self.startup_profile:
+            self.startup_profile.hook_fired()
+        if not self.backend.foreground_watched:
+            # No foreground events - poll, so a window switch still clears the buffer below
+            hwnd = self.backend.foreground_window()
+            if hwnd != self.foreground_hwnd:
+                self.on_foreground_change(hwnd, self.get_window_title(hwnd))
+        if self.recorder:
+            self.recorder.record('press', encode_key(key), self.foreground_hwnd)
         
+        start = time.perf_counter()
         try:
-            # Check if window changed - clear buffer and reset first word tracking
-            current_window = win32gui.GetForegroundWindow()
-            if current_window != self.last_active_window:
-                if self.current_word_keys:
-                    print(f"  [Window changed - CLEARED buffer: '{self.current_word_keys}']")
-                self.current_word_keys = ""
-                self.last_active_window = current_window
-                # Reset first word tracking - user switched to new window
-                self.is_first_word_of_line = True
-                self.direction_set_for_line = False
+            if self.retired_lexicons:
+                self.close_retired_lexicons()
             
-            # Track Ctrl for undo detection
-            if key == Key.ctrl_l or key == Key.ctrl_r:
-                self.ctrl_pressed = True
-                return
+            # fix_words() reads the typed state on the worker thread - see typed_lock
+            with self.typed_lock:
+                # Check if window changed - clear buffer and reset first word tracking
+                current_window = self.foreground_hwnd
+                if current_window != self.last_active_window:
+                    if self.current_word_keys:
+                        print(f"  [Window changed - CLEARED buffer: '{self.current_word_keys}']")
+                    self.current_word_keys = ""
+                    self.last_active_window = current_window
+                    self.track_typed(None)
+                    # Reset first word tracking - user switched to new window
+                    self.is_first_word_of_line = True
+                    self.direction_set_for_line = False
             
-            # Detect Ctrl+` (backtick) for undo OR force-fix - vk code 192
-            if self.ctrl_pressed and hasattr(key, 'vk') and key.vk == 192:
-                if self.last_fix_info:
-                    # Undo last fix
-                    threading.Thread(target=self.handle_undo, daemon=True).start()
-                elif self.last_unfixed_word:
-                    # Force-fix unfixed word
-                    threading.Thread(target=self.handle_force_fix, daemon=True).start()
-                return
+                # Track Ctrl for undo detection
+                if key == Key.ctrl_l or key == Key.ctrl_r:
+                    self.ctrl_pressed = True
+                    return
             
-            # Track Alt and Shift for language toggle detection
-            if key == Key.alt_l or key == Key.alt_r:
-                self.alt_pressed = True
-                return
-            if key == Key.shift_l or key == Key.shift_r:
-                if self.alt_pressed:
-                    # Alt+Shift detected - toggle language
-                    self.toggle_language()
-                    self.current_word_keys = ""
-                    self.alt_pressed = False
+                # Detect Ctrl+` (backtick) for undo OR force-fix - vk code 192
+                if self.ctrl_pressed and hasattr(key, 'vk') and key.vk == 192:
+                    if self.last_fix_info:
+                        # Undo last fix
+                        self.start_action(self.handle_undo)
+                    elif self.last_unfixed_word:
+                        # Force-fix unfixed word
+                        self.start_action(self.handle_force_fix)
+                    return
+            
+                # Track Alt and Shift for language toggle detection
+                if key == Key.alt_l or key == Key.alt_r:
+                    self.alt_pressed = True
+                    return
+                if key == Key.shift_l or key == Key.shift_r:
+                    if self.alt_pressed:
+                        # Alt+Shift detected - toggle language
+                        self.toggle_language()
+                        self.current_word_keys = ""
+                        self.alt_pressed = False
+                        return
+                    self.shift_pressed = True
                     return
-                self.shift_pressed = True
-                return
             
-            # Get physical key from vk code
-            key_char = None
-            if hasattr(key, 'vk') and key.vk is not None:
-                vk = key.vk
-                if vk in self.VK_TO_ENGLISH:
-                    key_char = self.VK_TO_ENGLISH[vk]
+                # Get physical key from vk code
+                key_char = None
+                if hasattr(key, 'vk') and key.vk is not None:
+                    vk = key.vk
+                    if vk in self.VK_TO_ENGLISH:
+                        key_char = self.VK_TO_ENGLISH[vk]
             
-            if key_char:
-                self.current_word_keys += key_char
+                if key_char:
+                    self.current_word_keys += key_char
+                    if self.fix_worker.outstanding:
+                        self.track_typed(self.typed_char(key_char))
             
-            elif key == Key.enter:
-                # Process current word first if any
-                if len(self.current_word_keys) >= 2:
-                    corrected, target = self.analyze_and_fix(self.current_word_keys)
+                elif key == Key.enter:
+                    # Process current word first if any
+                    if len(self.current_word_keys) >= 2:
+                        with self.latency.time('classify'):
+                            corrected, target = self.analyze_and_fix(self.current_word_keys)
                     
-                    if corrected and target:
-                        original_keys = self.current_word_keys
-                        is_first = self.is_first_word_of_line
-                        if self.is_first_word_of_line:
-                            self.is_first_word_of_line = False
-                        self.last_unfixed_word = None  # Clear - word was fixed
-                        self.last_fix_info = None  # Will be set in fix_word
-                        threading.Thread(
-                            target=self.fix_word,
-                            args=(corrected, target, original_keys, is_first),
-                            daemon=True
-                        ).start()
+                        if corrected and target:
+                            original_keys = self.current_word_keys
+                            is_first = self.is_first_word_of_line
+                            if self.is_first_word_of_line:
+                                self.is_first_word_of_line = False
+                            self.last_unfixed_word = None  # Clear - word was fixed
+                            self.last_fix_info = None  # Will be set in fix_words
+                            self.current_word_keys = ""
+                            self.submit_fix(corrected, target, original_keys, is_first, '\n')
+                        else:
+                            # Word was NOT fixed - store for potential force-fix
+                            self.last_unfixed_word = self.current_word_keys
+                            self.last_unfixed_end = '\n'
+                            self.last_unfixed_was_first = self.is_first_word_of_line  # Remember if it was first
+                            self.last_fix_info = None  # No fix happened
+                            # Word was correct - but still set direction if first word
+                            if self.is_first_word_of_line:
+                                detected_lang = self.detect_language(self.current_word_keys)
+                                if detected_lang:
+                                    self.log(f"  [DIRECTION] First word correct, setting direction for: {detected_lang}")
+                                    # Queue it behind any pending fix
+                                    self.start_action(self.set_first_word_direction, detected_lang)
+                                    self.last_unfixed_was_first = False  # Direction was set
+                                else:
+                                    # Language not detected, direction NOT set - keep last_unfixed_was_first = True
+                                    pass
+                                self.is_first_word_of_line = False
+                            self.current_word_keys = ""
+                            self.track_typed('\n')
                     else:
-                        # Word was NOT fixed - store for potential force-fix
-                        self.last_unfixed_word = self.current_word_keys
-                        self.last_unfixed_was_first = self.is_first_word_of_line  # Remember if it was first
-                        self.last_fix_info = None  # No fix happened
-                        # Word was correct - but still set direction if first word
-                        if self.is_first_word_of_line:
-                            detected_lang = self.detect_language(self.current_word_keys)
-                            if detected_lang:
-                                self.log(f"  [DIRECTION] First word correct, setting direction for: {detected_lang}")
-                                # Run in thread with delay like fix_word does
-                                def set_dir(lang):
-                                    time.sleep(0.05)
-                                    self.set_alignment(lang, wake_editor=True)
-                                    self.direction_set_for_line = True
-                                threading.Thread(target=set_dir, args=(detected_lang,), daemon=True).start()
-                                self.last_unfixed_was_first = False  # Direction was set
-                            else:
-                                # Language not detected, direction NOT set - keep last_unfixed_was_first = True
-                                pass
-                            self.is_first_word_of_line = False
                         self.current_word_keys = ""
-                else:
-                    self.current_word_keys = ""
+                        self.track_typed('\n')
                 
-                # New line - reset first word tracking
-                self.is_first_word_of_line = True
-                self.direction_set_for_line = False
+                    # New line - reset first word tracking
+                    self.is_first_word_of_line = True
+                    self.direction_set_for_line = False
             
-            elif key in [Key.space, Key.tab]:
-                if len(self.current_word_keys) >= 2:
-                    corrected, target = self.analyze_and_fix(self.current_word_keys)
+                elif key in [Key.space, Key.tab]:
+                    end = ' ' if key == Key.space else '\t'
+                    if len(self.current_word_keys) >= 2:
+                        with self.latency.time('classify'):
+                            corrected, target = self.analyze_and_fix(self.current_word_keys)
                     
-                    if corrected and target:
-                        original_keys = self.current_word_keys
-                        is_first = self.is_first_word_of_line
-                        if self.is_first_word_of_line:
-                            self.is_first_word_of_line = False
-                        self.last_unfixed_word = None  # Clear - word was fixed
-                        self.last_fix_info = None  # Will be set in fix_word
-                        threading.Thread(
-                            target=self.fix_word,
-                            args=(corrected, target, original_keys, is_first),
-                            daemon=True
-                        ).start()
+                        if corrected and target:
+                            original_keys = self.current_word_keys
+                            is_first = self.is_first_word_of_line
+                            if self.is_first_word_of_line:
+                                self.is_first_word_of_line = False
+                            self.last_unfixed_word = None  # Clear - word was fixed
+                            self.last_fix_info = None  # Will be set in fix_words
+                            self.current_word_keys = ""
+                            self.submit_fix(corrected, target, original_keys, is_first, end)
+                        else:
+                            # Word was NOT fixed - store for potential force-fix
+                            self.last_unfixed_word = self.current_word_keys
+                            self.last_unfixed_end = end
+                            self.last_unfixed_was_first = self.is_first_word_of_line  # Remember if it was first
+                            self.last_fix_info = None  # No fix happened
+                            # Word was correct - but still set direction if first word
+                            if self.is_first_word_of_line:
+                                detected_lang = self.detect_language(self.current_word_keys)
+                                if detected_lang:
+                                    self.log(f"  [DIRECTION] First word correct, setting direction for: {detected_lang}")
+                                    # Queue it behind any pending fix
+                                    self.start_action(self.set_first_word_direction, detected_lang)
+                                    self.last_unfixed_was_first = False  # Direction was set
+                                else:
+                                    # Language not detected, direction NOT set - keep last_unfixed_was_first = True
+                                    pass
+                                self.is_first_word_of_line = False
+                            self.current_word_keys = ""
+                            self.track_typed(end)
                     else:
-                        # Word was NOT fixed - store for potential force-fix
-                        self.last_unfixed_word = self.current_word_keys
-                        self.last_unfixed_was_first = self.is_first_word_of_line  # Remember if it was first
-                        self.last_fix_info = None  # No fix happened
-                        # Word was correct - but still set direction if first word
-                        if self.is_first_word_of_line:
-                            detected_lang = self.detect_language(self.current_word_keys)
-                            if detected_lang:
-                                self.log(f"  [DIRECTION] First word correct, setting direction for: {detected_lang}")
-                                # Run in thread with delay like fix_word does
-                                def set_dir(lang):
-                                    time.sleep(0.05)
-                                    self.set_alignment(lang, wake_editor=True)
-                                    self.direction_set_for_line = True
-                                threading.Thread(target=set_dir, args=(detected_lang,), daemon=True).start()
-                                self.last_unfixed_was_first = False  # Direction was set
-                            else:
-                                # Language not detected, direction NOT set - keep last_unfixed_was_first = True
-                                pass
-                            self.is_first_word_of_line = False
                         self.current_word_keys = ""
-                else:
+                        self.track_typed(end)
+            
+                elif key == Key.backspace:
+                    if self.current_word_keys:
+                        self.current_word_keys = self.current_word_keys[:-1]
+                    if self.fix_worker.outstanding:
+                        # Erasing past what was typed after the fix would reach the fixed word
+                        self.typed_after_fix = self.typed_after_fix[:-1] if self.typed_after_fix else None
+            
+                elif key in [Key.left, Key.right, Key.up, Key.down, Key.home, Key.end]:
                     self.current_word_keys = ""
+                    self.track_typed(None)
             
-            elif key == Key.backspace:
-                if self.current_word_keys:
-                    self.current_word_keys = self.current_word_keys[:-1]
+                elif key not in [Key.caps_lock, Key.shift, Key.ctrl, Key.alt]:
+                    # Numpad, Delete, Esc, function keys... - whatever they did to the
+                    # text isn't tracked, so a queued fix can't safely retype it
+                    self.track_typed(None)
             
-            elif key in [Key.left, Key.right, Key.up, Key.down, Key.home, Key.end]:
-                self.current_word_keys = ""
+                # Advance the prefix walk so the verdict is ready when the word ends
+                self.word_cursor.sync(self.current_word_keys)
             
         except Exception as e:
             if self.debug:
                 print(f"Error: {e}")
+        finally:
+            self.latency.record('hook', time.perf_counter() - start)
     
     def on_key_release(self, key):
         """Track key releases for Alt+Shift detection"""
+        if self.recorder:
+            self.recorder.record('release', encode_key(key), self.foreground_hwnd)
         if key == Key.alt_l or key == Key.alt_r:
             self.alt_pressed = False
         if key == Key.shift_l or key == Key.shift_r:
@@ -1169,170 +3970,48 @@ class HebrewEnglishSwitcher:
     
     def start_session_monitor(self):
         """Monitor for session unlock events and reset to English"""
-        import ctypes
-        from ctypes import wintypes, Structure, WINFUNCTYPE, c_int, c_void_p, c_wchar_p, POINTER
-        
         self.file_log("SESSION_MONITOR: Starting...")
-        
-        user32 = ctypes.windll.user32
-        kernel32 = ctypes.windll.kernel32
-        wtsapi32 = ctypes.windll.wtsapi32
-        
-        # Set up DefWindowProcW properly for 64-bit
-        user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
-        user32.DefWindowProcW.restype = ctypes.c_longlong
-        
-        # Window messages
-        WM_WTSSESSION_CHANGE = 0x02B1
-        WM_POWERBROADCAST = 0x0218
-        
-        # Session notification types
-        WTS_SESSION_LOCK = 0x7
-        WTS_SESSION_UNLOCK = 0x8
-        WTS_SESSION_LOGON = 0x5
-        WTS_SESSION_LOGOFF = 0x6
-        
-        # Power events
-        PBT_APMRESUMEAUTOMATIC = 0x0012
-        PBT_APMRESUMESUSPEND = 0x0007
-        
-        # Notification flags
-        NOTIFY_FOR_THIS_SESSION = 0
-        
-        # Define WNDCLASSEXW structure
-        class WNDCLASSEXW(Structure):
-            _fields_ = [
-                ("cbSize", wintypes.UINT),
-                ("style", wintypes.UINT),
-                ("lpfnWndProc", c_void_p),
-                ("cbClsExtra", c_int),
-                ("cbWndExtra", c_int),
-                ("hInstance", wintypes.HINSTANCE),
-                ("hIcon", wintypes.HICON),
-                ("hCursor", wintypes.HICON),
-                ("hbrBackground", wintypes.HBRUSH),
-                ("lpszMenuName", c_wchar_p),
-                ("lpszClassName", c_wchar_p),
-                ("hIconSm", wintypes.HICON),
-            ]
-        
-        # Use platform-appropriate types for WPARAM and LPARAM (64-bit on 64-bit Windows)
-        if ctypes.sizeof(c_void_p) == 8:  # 64-bit
-            WNDPROC = WINFUNCTYPE(ctypes.c_longlong, ctypes.c_void_p, wintypes.UINT, ctypes.c_ulonglong, ctypes.c_longlong)
-        else:  # 32-bit
-            WNDPROC = WINFUNCTYPE(ctypes.c_long, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
-        
-        def wnd_proc(hwnd, msg, wparam, lparam):
-            try:
-                if msg == WM_WTSSESSION_CHANGE:
-                    self.file_log(f"SESSION_MONITOR: WM_WTSSESSION_CHANGE received, wparam={wparam}")
-                    if wparam == WTS_SESSION_UNLOCK:
-                        self.log("  [Session UNLOCK detected - resetting to ENGLISH]")
-                        self.file_log(f"SESSION_UNLOCK: resetting tracked_language to english (was {self.tracked_language})")
-                        self.tracked_language = 'english'
-                        self.current_word_keys = ""
-                    elif wparam == WTS_SESSION_LOGON:
-                        self.log("  [Session LOGON detected - resetting to ENGLISH]")
-                        self.file_log(f"SESSION_LOGON: resetting tracked_language to english (was {self.tracked_language})")
-                        self.tracked_language = 'english'
-                        self.current_word_keys = ""
-                    elif wparam == WTS_SESSION_LOCK:
-                        self.file_log(f"SESSION_LOCK: screen locked")
-                
-                elif msg == WM_POWERBROADCAST:
-                    self.file_log(f"SESSION_MONITOR: WM_POWERBROADCAST received, wparam={wparam}")
-                    if wparam in (PBT_APMRESUMEAUTOMATIC, PBT_APMRESUMESUSPEND):
-                        self.log("  [Wake from sleep detected - resetting to ENGLISH]")
-                        self.file_log(f"WAKE_FROM_SLEEP: resetting tracked_language to english (was {self.tracked_language})")
-                        self.tracked_language = 'english'
-                        self.current_word_keys = ""
-            except Exception as e:
-                self.file_log(f"SESSION_MONITOR: Error in wnd_proc: {e}")
-            
-            return user32.DefWindowProcW(hwnd, msg, wparam, lparam)
-        
-        # Keep reference to prevent garbage collection
-        self._wnd_proc_cb = WNDPROC(wnd_proc)
-        
-        # Get module handle
-        hInstance = kernel32.GetModuleHandleW(None)
-        
-        # Use unique class name
-        import random
-        class_name = f"SessionMonitor_{random.randint(10000, 99999)}"
-        
-        # Register window class using WNDCLASSEXW
-        wc = WNDCLASSEXW()
-        wc.cbSize = ctypes.sizeof(WNDCLASSEXW)
-        wc.lpfnWndProc = ctypes.cast(self._wnd_proc_cb, c_void_p)
-        wc.lpszClassName = class_name
-        wc.hInstance = hInstance
-        
-        atom = user32.RegisterClassExW(ctypes.byref(wc))
-        if not atom:
-            error = kernel32.GetLastError()
-            self.log(f"  [Warning: Could not register session monitor class, error={error}]")
-            self.file_log(f"SESSION_MONITOR: FAILED to register class, error={error}")
-            return
-        
-        # Create a hidden window (not message-only, WTS needs a real window)
-        hwnd = user32.CreateWindowExW(
-            0,                      # dwExStyle
-            class_name,             # lpClassName  
-            "SessionMonitor",       # lpWindowName
-            0,                      # dwStyle (no visible style)
-            0, 0, 0, 0,            # x, y, width, height
-            None,                   # hWndParent (None = top-level)
-            None,                   # hMenu
-            hInstance,              # hInstance
-            None                    # lpParam
-        )
-        
-        if not hwnd:
-            error = kernel32.GetLastError()
-            self.log(f"  [Warning: Could not create session monitor window, error={error}]")
-            self.file_log(f"SESSION_MONITOR: FAILED to create window, error={error}")
-            return
-        
-        # Register for session notifications
-        if not wtsapi32.WTSRegisterSessionNotification(hwnd, NOTIFY_FOR_THIS_SESSION):
-            error = kernel32.GetLastError()
-            self.log(f"  [Warning: Could not register for session notifications, error={error}]")
-            self.file_log(f"SESSION_MONITOR: FAILED to register session notifications, error={error}")
-            user32.DestroyWindow(hwnd)
+        self.backend.watch_session_events(self.on_session_event, log=self.file_log, warn=self.log)
+    
+    def on_session_event(self, event):
+        """Session/power event from the backend: 'unlock', 'logon', 'lock' or 'resume'"""
+        if event == 'unlock':
+            self.log("  [Session UNLOCK detected - resetting to ENGLISH]")
+            self.file_log(f"SESSION_UNLOCK: resetting tracked_language to english (was {self.tracked_language})")
+        elif event == 'logon':
+            self.log("  [Session LOGON detected - resetting to ENGLISH]")
+            self.file_log(f"SESSION_LOGON: resetting tracked_language to english (was {self.tracked_language})")
+        elif event == 'resume':
+            self.log("  [Wake from sleep detected - resetting to ENGLISH]")
+            self.file_log(f"WAKE_FROM_SLEEP: resetting tracked_language to english (was {self.tracked_language})")
+        else:
+            if event == 'lock':
+                self.file_log(f"SESSION_LOCK: screen locked")
             return
-        
-        self.log("  [Session monitor started - will reset to English on unlock/logon]")
-        self.file_log("SESSION_MONITOR: Started successfully, listening for unlock/logon events")
-        
-        # Message loop
-        msg = wintypes.MSG()
-        while self.is_running:
-            # Use GetMessage for better CPU efficiency, but with timeout via PeekMessage
-            if user32.PeekMessageW(ctypes.byref(msg), hwnd, 0, 0, 1):  # PM_REMOVE = 1
-                user32.TranslateMessage(ctypes.byref(msg))
-                user32.DispatchMessageW(ctypes.byref(msg))
-            else:
-                time.sleep(0.1)
-        
-        # Cleanup
-        wtsapi32.WTSUnRegisterSessionNotification(hwnd)
-        user32.DestroyWindow(hwnd)
+        self.tracked_language = 'english'
+        self.current_word_keys = ""
     
     def on_mouse_click(self, x, y, button, pressed):
         """Clear buffer on mouse click and reset first word tracking"""
+        if self.startup_profile:
+            self.startup_profile.hook_fired()
+        if self.recorder:
+            self.recorder.record('click' if pressed else 'click_up', getattr(button, 'name', str(button)),
+                                 self.foreground_hwnd)
         if pressed:
-            if self.current_word_keys:
-                print(f"  [Mouse click - CLEARED buffer: '{self.current_word_keys}']")
-                self.current_word_keys = ""
-            # Reset first word tracking - user clicked somewhere new
-            self.is_first_word_of_line = True
-            self.direction_set_for_line = False
+            with self.typed_lock:
+                if self.current_word_keys:
+                    print(f"  [Mouse click - CLEARED buffer: '{self.current_word_keys}']")
+                    self.current_word_keys = ""
+                # Reset first word tracking - user clicked somewhere new
+                self.is_first_word_of_line = True
+                self.direction_set_for_line = False
+                self.track_typed(None)
     
     def run(self):
         def quit_app():
             self.log("\nQuitting...")
-            self.is_running = False
+            self.stop()
         
         def set_english():
             self.set_language('english')
@@ -1343,34 +4022,62 @@ class HebrewEnglishSwitcher:
         def show_about():
             self.show_about_dialog()
         
-        keyboard.add_hotkey('ctrl+alt+q', quit_app)
-        keyboard.add_hotkey('ctrl+alt+e', set_english)
-        keyboard.add_hotkey('ctrl+alt+h', set_hebrew)
-        keyboard.add_hotkey('ctrl+alt+a', show_about)
-        keyboard.add_hotkey('ctrl+alt+r', self.release_all_keys)
+        self.backend.add_hotkey('ctrl+alt+q', quit_app)
+        self.backend.add_hotkey('ctrl+alt+e', set_english)
+        self.backend.add_hotkey('ctrl+alt+h', set_hebrew)
+        self.backend.add_hotkey('ctrl+alt+a', show_about)
+        self.backend.add_hotkey('ctrl+alt+r', self.release_all_keys)
+        self.backend.add_hotkey('ctrl+alt+l', self.dump_latency)
+        if self.startup_profile:
+            self.startup_profile.mark('hotkeys')
         
         # Start power monitor in background thread
         session_thread = threading.Thread(target=self.start_session_monitor, daemon=True)
         session_thread.start()
         
-        # Start mouse listener in background
-        mouse_listener = pynput_mouse.Listener(on_click=self.on_mouse_click)
-        mouse_listener.start()
+        # Fixes run on one worker thread, in order
+        self.fix_worker.start()
         
-        with pynput_keyboard.Listener(
-            on_press=self.on_key_press,
-            on_release=self.on_key_release
-        ) as listener:
-            while self.is_running:
-                time.sleep(0.1)
-            listener.stop()
+        # Foreground window / title changes are pushed to on_foreground_change
+        self.backend.start_foreground_watch(self.on_foreground_change)
+        
+        if self.startup_profile:
+            self.startup_profile.mark('background_threads')
         
-        mouse_listener.stop()
+        # Start keyboard and mouse listeners
+        self.backend.start_listeners(self.on_key_press, self.on_key_release, self.on_mouse_click)
+        if self.startup_profile:
+            self.startup_profile.mark('listeners')
+        try:
+            # Hook is live - now load the full dictionaries in the background
+            threading.Thread(target=self.load_dictionaries, daemon=True).start()
+            threading.Thread(target=self.autosave_english_cache, daemon=True).start()
+            threading.Thread(target=self.watch_word_files, daemon=True).start()
+            # Sleep until Ctrl+Alt+Q - no polling
+            self.stop_event.wait()
+        finally:
+            self.backend.stop_listeners()
+            self.backend.stop_session_events()
+            self.backend.stop_directory_watch()
+            self.backend.stop_foreground_watch()
+            self.fix_worker.stop()
+        
+        self.save_english_cache()
+        self.log(f"  [English cache: {self.english_cache.stats()}]")
+        self.log(f"  [Decision cache: {self.decision_cache.stats()}]")
+        self.log(f"  [Hebrew lexicon: {self.hebrew_hot.stats()}]")
+        self.log(f"  [Memory: {self.memory_stats()}]")
+        self.log(f"  [Fix worker: {self.fix_worker.stats()}, {self.abandoned_fixes} fixes abandoned]")
+        self.log(f"  [Wake-ups: {self.wakeup_stats()}]")
+        try:
+            self.latency.save(self.latency_file)
+        except Exception as e:
+            self.log(f"  [Could not write latency stats: {e}]")
+        if self.file_logger is not None:
+            self.file_logger.close()
     
     def show_about_dialog(self):
         """Show About dialog with copyright info"""
-        import ctypes
-        
         about_text = """Hebrew-English Auto Keyboard Switcher
 Version 3.1.64
 
@@ -1385,15 +4092,529 @@ Hotkeys:
   Ctrl+Alt+H     - Force Hebrew
   Ctrl+Alt+A     - About
   Ctrl+Alt+R     - Release stuck keys
+  Ctrl+Alt+L     - Latency stats
   Ctrl+Alt+Q     - Quit"""
         
-        # Show message box (Windows)
-        ctypes.windll.user32.MessageBoxW(
-            0, 
-            about_text, 
-            "About Auto Switcher", 
-            0x40  # MB_ICONINFORMATION
-        )
+        self.backend.message_box(about_text, "About Auto Switcher")
+
+
+def encode_key(key):
+    """Recording name for a pynput key: 'vk:65' or 'key:space'"""
+    if isinstance(key, Key):
+        return f"key:{key.name}"
+    vk = getattr(key, 'vk', None)
+    if vk is not None:
+        return f"vk:{vk}"
+    return f"char:{getattr(key, 'char', '')}"
+
+
+def decode_key(text):
+    """pynput key for a name written by encode_key(). A special key this Key
+    doesn't have (the stand-in only lists the keys the switcher looks at, and
+    a recording may come from another pynput) becomes a KeyCode without vk or
+    char - an untracked key, as far as the switcher is concerned."""
+    kind, _, value = text.partition(':')
+    if kind == 'key':
+        try:
+            return Key[value]
+        except KeyError:
+            return KeyCode()
+    if kind == 'vk':
+        return KeyCode.from_vk(int(value))
+    return KeyCode.from_char(value)
+
+
+def process_start_time():
+    """When this process was created (epoch seconds), or None if unknown.
+    Covers interpreter start-up and, for the EXE, unpacking the bundle."""
+    if sys.platform != 'win32':
+        return None
+    try:
+        creation, exit_time, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        kernel32.GetProcessTimes.argtypes = [ctypes.c_void_p] + [ctypes.c_void_p] * 4
+        if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(creation),
+                                        ctypes.byref(exit_time), ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+        # FILETIME: 100 ns units since 1601-01-01
+        return (creation.value - 116444736000000000) / 1e7
+    except Exception:
+        return None
+
+
+class StartupProfile:
+    """--profile-startup: where the time goes between process start and the
+    first hook callback.
+    
+    main() and run() call mark() at the end of each phase; a phase's time is
+    the time since the previous mark. The report (JSON) is written once the
+    first key or mouse event has reached the hook and the background
+    dictionary load has finished, so it has both. It includes every module
+    imported by the script (inclusive time and nesting depth), the
+    third-party import times (IMPORT_TIMES), the dictionary load stages with
+    their throughput, and whether this is the EXE or the script.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.phases = {}
+        self.process_start = process_start_time()
+        if self.process_start is not None:
+            self.phases['interpreter'] = max(0.0, STARTUP_WALL - self.process_start)
+        self._last = STARTUP_PERF
+        self._hook_fired = False
+        self._dictionaries = None
+        self._written = False
+        self._lock = threading.Lock()
+    
+    def mark(self, phase):
+        """End `phase` now"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+    
+    def hook_fired(self):
+        """Called from the hook on every event - only the first one counts"""
+        if self._hook_fired:
+            return
+        self._hook_fired = True
+        self.mark('until_first_hook_callback')
+        self.write_when_complete()
+    
+    def dictionaries_loaded(self, timings, words):
+        """Background load finished: stage times and entries loaded per stage"""
+        self._dictionaries = {
+            stage: {'seconds': round(seconds, 6),
+                    'entries': words.get(stage, 0),
+                    'entries_per_second': round(words[stage] / seconds) if words.get(stage) and seconds else None}
+            for stage, seconds in timings.items()}
+        self.write_when_complete()
+    
+    def report(self):
+        total = sum(self.phases.values())
+        waiting = self.phases.get('until_first_hook_callback', 0.0)
+        return {
+            'version': '3.1.64',
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'python': sys.version.split()[0],
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.process_start or STARTUP_WALL)),
+            'hook_live_seconds': round(total - waiting, 6),
+            'total_seconds': round(total, 6),
+            'phases': {phase: round(seconds, 6) for phase, seconds in self.phases.items()},
+            'imports': [{'module': name, 'seconds': round(seconds, 6), 'depth': depth}
+                        for name, seconds, depth in STARTUP_IMPORTS],
+            'third_party_imports': {name: round(seconds, 6) for name, seconds in IMPORT_TIMES.items()},
+            'dictionaries': self._dictionaries,
+        }
+    
+    def write_when_complete(self):
+        with self._lock:
+            if self._written or not self._hook_fired or self._dictionaries is None:
+                return
+            self._written = True
+        report = self.report()
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            os.replace(tmp_path, self.path)
+            print(f"  Startup profile: hook live after {report['hook_live_seconds'] * 1000:.0f} ms, "
+                  f"first event after {report['total_seconds'] * 1000:.0f} ms - written to {self.path}")
+        except Exception as e:
+            print(f"  Could not write {self.path}: {e}")
+
+
+class KeyEventRecorder:
+    """Records the raw key and mouse events seen by the hook, for replay_recording().
+    
+    One line per event: ms since start, kind (press/release/click/click_up),
+    key (see encode_key) or mouse button, foreground window handle - tab separated.
+    """
+    
+    HEADER = '# auto_switcher recording v1'
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(self.HEADER + '\n')
+    
+    def record(self, kind, key, hwnd):
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        with self._lock:
+            if self._file:
+                self._file.write(f"{elapsed_ms:.1f}\t{kind}\t{key}\t{hwnd or 0}\n")
+                self.count += 1
+    
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path):
+    """Yield (seconds, kind, key, hwnd) events from a KeyEventRecorder file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if f.readline().rstrip('\n') != KeyEventRecorder.HEADER:
+            raise ValueError(f"{path} is not a recording")
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 4:
+                yield float(parts[0]) / 1000, parts[1], parts[2], int(parts[3])
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+class ReplaySwitcher(HebrewEnglishSwitcher):
+    """Switcher on a FakeBackend, driven by replay_recording(). The fix worker
+    thread is never started - the driver runs queued actions itself."""
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('backend', FakeBackend())
+        super().__init__(**kwargs)
+        self.backend.start_foreground_watch(self.on_foreground_change)
+
+
+def replay_recording(path, tracked_language='english'):
+    """
+    Feed a recording through a ReplaySwitcher and measure it.
+    Events are replayed on the recorded timeline and the fix worker is
+    emulated on the same virtual clock: a queued action starts once the
+    previous one has finished, and key presses keep arriving meanwhile.
+    Returns a dict of counts and latency percentiles.
+    """
+    backend = FakeBackend()
+    switcher = ReplaySwitcher(backend=backend)
+    switcher.load_dictionaries()
+    switcher.tracked_language = tracked_language
+    worker = switcher.fix_worker
+    
+    event_latencies = []
+    fix_latencies = []
+    fix_os_calls = []
+    events = fixes = 0
+    free_at = 0.0  # Virtual time the worker finishes its current action
+    
+    def run_actions(until):
+        """Run the queued actions the worker would start before `until`"""
+        nonlocal fixes, free_at
+        while True:
+            queued_at = worker.next_queued_at()
+            if queued_at is None or max(free_at, queued_at) >= until:
+                return
+            backend.clock = max(backend.clock, free_at, queued_at)
+            injected_before = len(backend.events)
+            calls_before = backend.os_calls()
+            start = time.perf_counter()
+            action, args, queued_at = worker.run_next()
+            backend.clock += time.perf_counter() - start
+            free_at = backend.clock
+            if action == switcher.fix_words and len(backend.events) > injected_before:
+                fixes += len(args[0])
+                fix_latencies.extend([backend.clock - queued_at] * len(args[0]))
+                fix_os_calls.append(backend.os_calls() - calls_before)
+    
+    for timestamp, kind, key, hwnd in read_recording(path):
+        run_actions(timestamp)
+        events += 1
+        backend.set_foreground(hwnd)
+        backend.clock = max(backend.clock, timestamp)
+        
+        start = time.perf_counter()
+        if kind == 'press':
+            switcher.on_key_press(decode_key(key))
+        elif kind == 'release':
+            switcher.on_key_release(decode_key(key))
+        elif kind in ('click', 'click_up'):
+            switcher.on_mouse_click(0, 0, key, kind == 'click')
+        event_latencies.append(time.perf_counter() - start)
+    run_actions(float('inf'))
+    
+    event_latencies.sort()
+    fix_latencies.sort()
+    return {
+        'events': events,
+        'fixes': fixes,
+        'fixes_merged': worker.merged,
+        'fixes_abandoned': switcher.abandoned_fixes,
+        'max_queue_depth': worker.max_depth,
+        'os_calls': dict(backend.calls),
+        'os_calls_per_fix': round(sum(fix_os_calls) / fixes, 1) if fixes else 0,
+        'event_latency_us': {f'p{p}': round(percentile(event_latencies, p) * 1e6, 1) for p in (50, 95, 99)},
+        'fix_latency_ms': {f'p{p}': round(percentile(fix_latencies, p) * 1000, 2) for p in (50, 95, 99)},
+        'stages': switcher.latency.summary(),
+        'hebrew_tiers': switcher.hebrew_hot.summary(),
+        'bloom': switcher.bloom_stats(),
+    }
+
+
+def read_key_strings(path):
+    """Yield physical-key strings from a one-word-per-line file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            keys = line.strip()
+            if keys and not keys.startswith('#'):
+                yield keys
+
+
+def classify_file(switcher, input_path, tracked_language='english', output_path=None, stream=None):
+    """Classify every word in input_path and stream the results as CSV, or as
+    JSON lines if output_path ends with .jsonl. Writes to stream (default
+    stdout) if no output_path. Returns (words, fixes)."""
+    out = open(output_path, 'w', encoding='utf-8', newline='') if output_path else (stream or sys.stdout)
+    as_jsonl = bool(output_path) and output_path.lower().endswith('.jsonl')
+    fields = ['keys', 'screen', 'fix', 'corrected', 'target_language']
+    writer = None if as_jsonl else csv.writer(out)
+    if writer:
+        writer.writerow(fields)
+    
+    words = fixes = 0
+    try:
+        for keys, screen, corrected, target_lang in switcher.classify_batch(read_key_strings(input_path), tracked_language):
+            words += 1
+            fix = corrected is not None
+            fixes += fix
+            row = [keys, screen, fix, corrected or '', target_lang or '']
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n')
+    finally:
+        if output_path:
+            out.close()
+    return words, fixes
+
+
+def self_test():
+    """
+    Headless checks on FakeBackend (no Windows, word lists or OpenCV needed).
+    Prints one line per check and returns the number of failures.
+    """
+    failures = 0
+    
+    def check(name, ok, detail=''):
+        nonlocal failures
+        failures += not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}" + (f" - {detail}" if detail and not ok else ''))
+    
+    # Button search on synthetic screenshots: both ribbon buttons pasted onto a
+    # flat ribbon with a little noise, in a normal and in a maximized window
+    # (whose rectangle starts at -8,-8 - off the screen)
+    load_imaging()
+    script_dir = get_script_dir()
+    paths = [os.path.join(script_dir, name) for name in ('align_left.png', 'align_right.png')]
+    if all(os.path.exists(path) for path in paths):
+        templates = [load_template(path) for path in paths]
+        rng = np.random.default_rng(0)
+        for rect, at in (((300, 200, 1500, 900), (640, 290)),
+                         ((-8, -8, 1928, 1048), (500, 40))):
+            screen = np.full((1080, 1920), 243, dtype=np.float32)
+            screen += rng.normal(0, 2, screen.shape).astype(np.float32)
+            expected = []
+            x, y = at
+            for template in templates:
+                th, tw = template.shape
+                screen[y:y + th, x:x + tw] = template
+                expected.append((x, y, tw, th))
+                x += tw + 6
+            backend = FakeBackend()
+            backend.screen = screen
+            backend.window_rects[backend.window] = rect
+            for path, box in zip(paths, expected):
+                locator = ButtonLocator(backend, path)
+                name = f"locate {os.path.basename(path)} in window at {rect[0]},{rect[1]}"
+                found, confidence = locator.locate(backend.window)
+                check(name, found == box and confidence == 0.9, f"got {found} ({confidence}), expected {box}")
+                captures = backend.calls['capture_gray']
+                found, confidence = locator.locate(backend.window)
+                check(name + " (cached)", found == box and backend.calls['capture_gray'] == captures + 1,
+                      f"got {found} after {backend.calls['capture_gray'] - captures} captures")
+    else:
+        print("  skip locate - align_left.png / align_right.png not found")
+    
+    # Typing through the fix worker, with the built-in word lists. The screen
+    # is rebuilt from the keys typed (in the layout active at the time) and
+    # the text the switcher injected.
+    import tempfile
+    vk_codes = {char: vk for vk, char in HebrewEnglishSwitcher.VK_TO_ENGLISH.items()}
+    ends = {Key.space: ' ', Key.tab: '\t', Key.enter: '\n'}
+    
+    with tempfile.TemporaryDirectory() as folder:
+        # A crash in the middle of an append leaves a torn last line
+        path = os.path.join(folder, 'torn_learned_words.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('# Learned words\nakuo,hebrew\nnv,heb')
+        learned = WordListFile(path, parse_learned_word, format_learned_word)
+        entries = dict(learned.load())
+        learned.add('ehr', 'english')
+        check("torn learned_words.txt line is skipped",
+              entries == {'akuo': 'hebrew'} and WordListFile(path, parse_learned_word, format_learned_word).load()
+              == {'akuo': 'hebrew', 'ehr': 'english'}, f"loaded {entries}")
+        
+        def session():
+            global IGNORED_WORDS, LEARNED_WORDS
+            IGNORED_WORDS, LEARNED_WORDS = {}, {}  # Undo in an earlier session added to them
+            switcher = ReplaySwitcher()
+            switcher.ignored_words_file.path = os.path.join(folder, 'ignore_words.txt')
+            switcher.learned_words_file.path = os.path.join(folder, 'learned_words.txt')
+            switcher.dictionaries_ready = True  # Built-in word lists only
+            switcher.screen = ''
+            return switcher
+        
+        def press(switcher, *keys):
+            for key in keys:
+                backend = switcher.backend
+                switcher.on_key_press(key)
+                switcher.on_key_release(key)
+                char = getattr(key, 'vk', None) and HebrewEnglishSwitcher.VK_TO_ENGLISH.get(key.vk)
+                if char and not switcher.ctrl_pressed:
+                    switcher.screen += keys_to_hebrew(char) if backend.layout == HebrewEnglishSwitcher.LANG_HEBREW else char
+                else:
+                    switcher.screen += ends.get(key, '')
+        
+        def type_keys(switcher, text):
+            keys = {char: key for key, char in ends.items()}
+            press(switcher, *[keys.get(char) or KeyCode.from_vk(vk_codes[char]) for char in text])
+        
+        def run_actions(switcher):
+            backend = switcher.backend
+            done = len(backend.events)
+            while switcher.fix_worker.run_next():
+                pass
+            for _, action, value in backend.events[done:]:
+                if action == 'replace_text':
+                    delete_count, text = value
+                    switcher.screen = switcher.screen[:len(switcher.screen) - delete_count] + text
+        
+        switcher = session()
+        switcher.dictionaries_ready = False
+        type_keys(switcher, 'drug ')
+        run_actions(switcher)
+        check("English word typed while the dictionaries load is left alone",
+              switcher.screen == 'drug ' and switcher.decision_cache.get('drug', 'english') is None, f"screen {switcher.screen!r}")
+        
+        switcher = session()
+        type_keys(switcher, 'akuo\t')
+        run_actions(switcher)
+        fixed = switcher.screen
+        switcher.on_key_press(Key.ctrl_l)
+        press(switcher, KeyCode.from_vk(192))  # Ctrl+`
+        switcher.on_key_release(Key.ctrl_l)
+        run_actions(switcher)
+        check("undo keeps the tab that ended the word", (fixed, switcher.screen) == ('שלום\t', 'akuo\t'),
+              f"fixed {fixed!r}, after undo {switcher.screen!r}")
+
+        switcher = session()
+        type_keys(switcher, 'hello\n')
+        run_actions(switcher)
+        switcher.on_key_press(Key.ctrl_l)
+        press(switcher, KeyCode.from_vk(192))  # Ctrl+` on a word that wasn't fixed
+        switcher.on_key_release(Key.ctrl_l)
+        run_actions(switcher)
+        check("force-fix keeps the newline that ended the word",
+              switcher.screen == switcher.keys_to_hebrew('hello') + '\n', f"screen {switcher.screen!r}")
+        
+        switcher = session()
+        type_keys(switcher, 'akuo nv')
+        run_actions(switcher)
+        type_keys(switcher, ' ')
+        run_actions(switcher)
+        check("word started while a fix waited follows the new layout", switcher.screen == 'שלום מה ',
+              f"screen {switcher.screen!r}")
+        
+        switcher = session()
+        type_keys(switcher, 'akuo ')
+        press(switcher, KeyCode.from_vk(0x61))  # Numpad 1
+        run_actions(switcher)
+        check("untracked key abandons a queued fix",
+              switcher.abandoned_fixes == 1 and not switcher.backend.calls['replace_text'],
+              f"{switcher.abandoned_fixes} abandoned, {switcher.backend.calls['replace_text']} replaced")
+        
+        switcher = session()
+        switcher.backend.foreground_watched = False  # As if SetWinEventHook had failed
+        type_keys(switcher, 'akuo ')
+        switcher.backend.window = 2  # Focus moves without a foreground event
+        run_actions(switcher)
+        check("fix without a foreground hook uses the current window", switcher.foreground_hwnd == 2,
+              f"fix went to window {switcher.foreground_hwnd}")
+        
+        switcher = session()
+        switcher.backend.foreground_watched = False
+        type_keys(switcher, 'akuo')
+        switcher.backend.window = 2
+        type_keys(switcher, ' ')
+        run_actions(switcher)
+        check("window switch without a foreground hook clears the word",
+              not switcher.backend.calls['replace_text'], f"screen {switcher.screen!r}")
+        
+        switcher = session()
+        switcher.tracked_language = 'hebrew'
+        type_keys(switcher, 'nv ')  # The first word of a line is also looked up for its direction
+        for _ in range(HotWordTier.PROMOTE_AFTER):
+            type_keys(switcher, 'akuo ')
+        check(f"Hebrew word typed {HotWordTier.PROMOTE_AFTER} times is promoted to the hot tier",
+              canonical_hebrew_keys('akuo') in switcher.hebrew_hot, switcher.hebrew_hot.stats())
+
+        recording = os.path.join(folder, 'recording.txt')
+        with open(recording, 'w', encoding='utf-8') as f:
+            f.write(KeyEventRecorder.HEADER + '\n')
+            for i, key in enumerate(['char:a', 'char:k', 'key:page_down', 'key:f5', 'key:space']):
+                f.write(f"{i * 50.0:.1f}\tpress\t{key}\t1\n")
+                f.write(f"{i * 50.0 + 20:.1f}\trelease\t{key}\t1\n")
+        try:
+            report = replay_recording(recording)
+            check("replay decodes special keys the Key enum doesn't list", report['events'] == 10,
+                  f"{report['events']} events replayed")
+        except Exception as e:
+            check("replay decodes special keys the Key enum doesn't list", False, repr(e))
+
+        cache_path = os.path.join(folder, 'english_cache.txt')
+        cache = EnglishSpellCache(tag='test')
+        cache.put('hello', True)
+        cache.put('hunter2', False)
+        cache.save(cache_path)
+        saved = EnglishSpellCache.load(cache_path, 'test', 100)
+        check("English cache saves dictionary hits only",
+              saved.get('hello') is True and saved.get('hunter2') is None, open(cache_path, encoding='utf-8').read())
+
+        dict_path = os.path.join(folder, 'hebrew_words.txt')
+        with open(dict_path, 'w', encoding='utf-8') as f:
+            f.write('שלום\n')
+        compile_own = globals()['compile_hebrew_dictionary']
+        def lose_race(src_path, dst_path):
+            """Another session's compile lands first and is mapped, so ours can't replace it"""
+            CompiledWordList.compile(['שלום'], dst_path)
+            raise PermissionError(5, 'Access is denied', dst_path)
+        globals()['compile_hebrew_dictionary'] = lose_race
+        try:
+            words = load_versioned_hebrew_dictionary(dict_path)
+            check("compile that loses the race maps the other session's file", 'שלום' in words)
+            words.close()
+        except Exception as e:
+            check("compile that loses the race maps the other session's file", False, repr(e))
+        finally:
+            globals()['compile_hebrew_dictionary'] = compile_own
+
+    return failures
+
+
+def get_arg_value(name, default=None):
+    """Value following `name` on the command line, or default"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
 
 
 def open_demo_on_first_run():
@@ -1428,12 +4649,74 @@ def open_demo_on_first_run():
             pass
 
 def main():
+    # Offline tools - run and exit without starting the switcher
+    if '--compile-dictionary' in sys.argv:
+        compile_hebrew_dictionary()
+        return
+    if '--build-index' in sys.argv:
+        build_key_indexes()
+        return
+    if '--export-english-words' in sys.argv:
+        if not export_english_words():
+            sys.exit(1)
+        return
+    if '--classify-file' in sys.argv:
+        # python auto_switcher.py --classify-file words.txt [--language hebrew] [--output results.csv|.jsonl]
+        # stdout is kept for the results - load messages and debug output go to stderr
+        results = sys.stdout
+        with redirect_stdout(sys.stderr):
+            switcher = HebrewEnglishSwitcher(backend=FakeBackend())
+            switcher.load_dictionaries()
+            start = time.perf_counter()
+            words, fixes = classify_file(switcher, get_arg_value('--classify-file'),
+                                         get_arg_value('--language', 'english'), get_arg_value('--output'), results)
+            elapsed = time.perf_counter() - start
+        rate = words / elapsed * 60 if elapsed else 0
+        print(f"  Classified {words:,} words ({fixes:,} fixes) in {elapsed:.2f}s - {rate:,.0f} words/min", file=sys.stderr)
+        return
+    
+    if '--self-test' in sys.argv:
+        failures = self_test()
+        print(f"  {'All checks passed' if not failures else f'{failures} check(s) failed'}")
+        sys.exit(1 if failures else 0)
+    
+    if '--replay' in sys.argv:
+        # python auto_switcher.py --replay recording.txt [--language hebrew]
+        report = replay_recording(get_arg_value('--replay'), get_arg_value('--language', 'english'))
+        print(json.dumps(report, indent=2))
+        return
+    
+    if not WINDOWS_AVAILABLE:
+        print("Missing packages. Run: pip install pynput pywin32 keyboard pyenchant pillow numpy opencv-python")
+        sys.exit(1)
+    
+    startup_profile = None
+    if '--profile-startup' in sys.argv:
+        # python auto_switcher.py --profile-startup [report.json]
+        path = get_arg_value('--profile-startup', '')
+        if not path or path.startswith('-'):
+            path = os.path.join(get_script_dir(), 'startup_profile.json')
+        startup_profile = StartupProfile(path)
+        startup_profile.mark('module')  # Imports and module-level setup
+    
     # Check for first run and open demo
     open_demo_on_first_run()
+    if startup_profile:
+        startup_profile.mark('first_run_check')
     
     debug_mode = '--debug' in sys.argv or '-d' in sys.argv  # Use --debug to enable logging
     switcher = HebrewEnglishSwitcher(debug=debug_mode)
-    switcher.run()
+    switcher.startup_profile = startup_profile
+    if startup_profile:
+        startup_profile.mark('switcher_init')
+    if '--record' in sys.argv:
+        # Capture the raw event stream for --replay
+        switcher.recorder = KeyEventRecorder(get_arg_value('--record'))
+    try:
+        switcher.run()
+    finally:
+        if switcher.recorder:
+            switcher.recorder.close()
 
 
 if __name__ == "__main__":
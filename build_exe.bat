@@ -10,6 +10,21 @@ echo Building executable...
 pyinstaller --onefile --noconsole --name auto_switcher_v3.1.64 auto_switcher_v3.1.64.py
 
 echo.
+echo Exporting English word list (en_US dictionary bundled with pyenchant)...
+python auto_switcher_v3.1.64.py --export-english-words
+if errorlevel 1 (
+    echo ERROR: could not export english_words.txt - is pyenchant installed?
+    pause
+    exit /b 1
+)
+echo Building key indexes (hebrew_keys.bin replaces hebrew_words.bin)...
+python auto_switcher_v3.1.64.py --build-index
+if not exist "english_keys.bin" (
+    echo ERROR: english_keys.bin was not built
+    pause
+    exit /b 1
+)
+
 echo Creating distribution folder...
 if not exist "dist\auto_switcher_v3.1.64" mkdir "dist\auto_switcher_v3.1.64"
 
@@ -17,6 +32,8 @@ copy "dist\auto_switcher_v3.1.64.exe" "dist\auto_switcher_v3.1.64\" >nul
 copy "config.ini" "dist\auto_switcher_v3.1.64\" >nul
 copy "ignore_words.txt" "dist\auto_switcher_v3.1.64\" >nul
 copy "hebrew_words.txt" "dist\auto_switcher_v3.1.64\" >nul
+copy "hebrew_keys.bin" "dist\auto_switcher_v3.1.64\" >nul
+copy "english_keys.bin" "dist\auto_switcher_v3.1.64\" >nul
 copy "align_left.png" "dist\auto_switcher_v3.1.64\" >nul
 copy "align_right.png" "dist\auto_switcher_v3.1.64\" >nul
 copy "README.txt" "dist\auto_switcher_v3.1.64\" >nul